@@ -1,20 +1,9 @@
-# Load bibfile
-	
+# Write author statistics stored as comments in the .bib database
+
 import json
 import os
-import bibtexparser
-from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.bibdatabase import BibDatabase
-from bibtexparser.customization import convert_to_unicode
-from bibtexparser.bparser import BibTexParser
-
-def Google_stats2latex(f,bibfile):
-    tbparser = BibTexParser(common_strings=True)
-    tbparser.alt_dict['url'] = 'url'	# this prevents change 'url' to 'link'
-    tbparser.expect_multiple_parse = True
-    with open(bibfile, encoding='utf-8') as bibtex_file:
-        bib_database = bibtexparser.load(bibtex_file, tbparser)
 
+def Google_stats2latex(f,bib_database):
     author_stats_string = [c for c in bib_database.comments if c.startswith('Google_stats')]
     author_stats = json.loads(author_stats_string[0].split('Google_stats: ')[1]) if author_stats_string else {}
 
@@ -30,13 +19,7 @@ def Google_stats2latex(f,bibfile):
     else:
         return False
     
-def Scopus_stats2latex(f,bibfile):
-    tbparser = BibTexParser(common_strings=True)
-    tbparser.alt_dict['url'] = 'url'	# this prevents change 'url' to 'link'
-    tbparser.expect_multiple_parse = True
-    with open(bibfile, encoding='utf-8') as bibtex_file:
-        bib_database = bibtexparser.load(bibtex_file, tbparser)
-
+def Scopus_stats2latex(f,bib_database):
     author_stats_string = [c for c in bib_database.comments if c.startswith('Scopus_stats')]
     author_stats = json.loads(author_stats_string[0].split('Scopus_stats: ')[1]) if author_stats_string else {}
 
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Backups of scholarship.bib made before make_cv modifies it
+# Each distinct version of a file is stored once, gzip compressed, in
+# Backups/objects/<sha256>.gz and Backups/snapshots.json records when it was
+# taken and which file it came from.  No snapshot is taken if the file has not
+# changed since the last one, and old snapshots are thinned out so the folder
+# does not grow without bound.
+# make_cv_restore lists the snapshots and copies one of them back.
+
+import argparse
+import configparser
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+
+# Retention: the most recent snapshots are always kept, older ones are thinned
+# to the newest snapshot of each day and then of each week
+keep_recent = 10
+keep_daily = 14
+keep_weekly = 8
+
+index_file = 'snapshots.json'
+objects_dir = 'objects'
+
+def read_snapshots(backup_dir):
+	try:
+		with open(os.path.join(backup_dir,index_file),'r',encoding='utf-8') as f:
+			return(json.load(f))
+	except (OSError, ValueError):
+		return([])
+
+def write_snapshots(backup_dir,snapshots):
+	filename = os.path.join(backup_dir,index_file)
+	with open(filename +'.tmp','w',encoding='utf-8') as f:
+		json.dump(snapshots,f,indent=1)
+	os.replace(filename +'.tmp',filename)
+
+def object_file(backup_dir,content_hash):
+	return(os.path.join(backup_dir,objects_dir,content_hash +'.gz'))
+
+def snapshot(src_file,backup_dir):
+	# store a copy of src_file unless it matches the last snapshot of that file
+	with open(src_file,'rb') as f:
+		content = f.read()
+	content_hash = hashlib.sha256(content).hexdigest()
+	src_file = os.path.abspath(src_file)
+
+	snapshots = read_snapshots(backup_dir)
+	previous = [snap for snap in snapshots if snap['file'] == src_file]
+	if previous and previous[-1]['hash'] == content_hash:
+		return(content_hash)
+
+	os.makedirs(os.path.join(backup_dir,objects_dir),exist_ok=True)
+	filename = object_file(backup_dir,content_hash)
+	if not os.path.isfile(filename):
+		with gzip.open(filename +'.tmp','wb') as f:
+			f.write(content)
+		os.replace(filename +'.tmp',filename)
+
+	snapshots.append({'time': datetime.now().isoformat(timespec='seconds'),
+						'file': src_file,
+						'hash': content_hash,
+						'size': len(content)})
+	snapshots = prune(snapshots)
+	write_snapshots(backup_dir,snapshots)
+
+	# remove stored versions that no snapshot refers to anymore
+	used = set(snap['hash'] for snap in snapshots)
+	for name in os.listdir(os.path.join(backup_dir,objects_dir)):
+		if name.endswith('.gz') and not name[:-3] in used:
+			os.remove(os.path.join(backup_dir,objects_dir,name))
+	return(content_hash)
+
+def prune(snapshots,now=None):
+	# returns the snapshots to keep, oldest first
+	if now is None:
+		now = datetime.now()
+	keep = set()
+	files = set(snap['file'] for snap in snapshots)
+	for file in files:
+		history = [n for n,snap in enumerate(snapshots) if snap['file'] == file]
+		keep.update(history[-keep_recent:])
+		days = set()
+		weeks = set()
+		for n in reversed(history):
+			taken = datetime.fromisoformat(snapshots[n]['time'])
+			day = taken.date()
+			week = taken.isocalendar()[:2]
+			if now -taken < timedelta(days=keep_daily) and not day in days:
+				days.add(day)
+				keep.add(n)
+			if now -taken < timedelta(weeks=keep_weekly) and not week in weeks:
+				weeks.add(week)
+				keep.add(n)
+	return([snap for n,snap in enumerate(snapshots) if n in keep])
+
+def restore(backup_dir,snap,outputfile):
+	with gzip.open(object_file(backup_dir,snap['hash']),'rb') as f:
+		content = f.read()
+	# keep the current version so the restore can be undone
+	if os.path.isfile(outputfile):
+		snapshot(outputfile,backup_dir)
+	with open(outputfile +'.tmp','wb') as f:
+		f.write(content)
+	os.replace(outputfile +'.tmp',outputfile)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description='This script lists and restores backups of the .bib file made by make_cv')
+	parser.add_argument('-b', '--backups',help='the Backups folder, default is <data_dir>/make_cv/Backups as used by make_cv')
+	parser.add_argument('-d', '--data_dir',help='the name of root directory containing the data folders, default is the one in the configuration file')
+	parser.add_argument('-f', '--configfile',default='make_cv.cfg',help='the configuration file, default is make_cv.cfg')
+	parser.add_argument('-o', '--output',help='where to write the restored file, default is the file the snapshot was taken from')
+	parser.add_argument('snapshot',nargs='?',type=int,help='the number of the snapshot to restore, leave out to list the snapshots')
+	args = parser.parse_args(argv)
+
+	if args.backups is None:
+		data_dir = args.data_dir
+		if data_dir is None:
+			# data_dir in make_cv.cfg is relative to the folder of the file
+			configuration = configparser.ConfigParser()
+			configuration.read(args.configfile)
+			if not ('CV' in configuration and 'data_dir' in configuration['CV'].keys()):
+				print('Could not read data_dir from ' +args.configfile +', use -f, -d or -b')
+				return
+			data_dir = os.path.join(os.path.dirname(args.configfile),configuration['CV']['data_dir'])
+		args.backups = os.path.join(data_dir,'make_cv','Backups')
+
+	snapshots = read_snapshots(args.backups)
+	if not snapshots:
+		print('No snapshots found in ' +args.backups)
+		return
+
+	# number the snapshots from newest to oldest
+	snapshots.reverse()
+	if args.snapshot is None:
+		for n,snap in enumerate(snapshots):
+			print(f"{n+1:4d}  {snap['time'].replace('T',' ')}  {snap['hash'][:10]}  {snap['size']:>9d}  {snap['file']}")
+		return
+
+	if args.snapshot < 1 or args.snapshot > len(snapshots):
+		print('There is no snapshot number ' +str(args.snapshot))
+		return
+	snap = snapshots[args.snapshot-1]
+	outputfile = args.output if args.output is not None else snap['file']
+	restore(args.backups,snap,outputfile)
+	print('Restored ' +outputfile +' from snapshot taken ' +snap['time'].replace('T',' '))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Times the stages of make_cv on made up data of increasing size
+# For each number of .bib entries a data folder is created with
+# synthetic_data.py and the .bib reading/writing, the bib_add_* stages,
+# each table of make_cv_tables and make_far_tables and get_collaborator_list
+# are timed.  Nothing goes to the network (Google Scholar is replaced by an
+# author built from the .bib file) and LaTeX is never run, so the times are
+# those of make_cv itself.
+#   python -m make_cv.benchmark -n 100 1000 10000 -o times.json
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+
+from .synthetic_data import make_synthetic_data
+from .create_config import create_config
+from .bib_io import load_bib
+from .bib_io import write_bib
+from .bib_reader import read_bib_entries
+from .bib_add_keywords import bib_add_keywords
+from .bib_add_student_markers import bib_add_student_markers
+from .bib_add_citations import bib_add_citations
+from .make_cv import make_cv_tables
+from .make_far import make_far_tables
+from .make_nsfcoa import get_collaborator_list
+from . import global_prefs
+
+class FakeScholarly:
+	# stands in for scholarly in google_author, the publications are the
+	# .bib entries with new citation counts
+	def __init__(self,entries):
+		self.publications = []
+		for n,entry in enumerate(entries):
+			pub = {'bib': {'title': entry.get('title',''), 'pub_year': entry.get('year',''),
+							'citation': entry.get('journal','') +' ' +entry.get('volume','')},
+					'num_citations': n % 50 +1}
+			# every other publication has to be matched by title
+			if n % 2 == 0:
+				pub['author_pub_id'] = 'author:' +entry.get('google_pub_id','')
+			else:
+				pub['author_pub_id'] = 'author:unknown' +str(n)
+			self.publications.append(pub)
+
+	def search_author_id(self,author_id):
+		return({'scholar_id': author_id})
+
+	def fill(self,author,sections=[]):
+		author['publications'] = self.publications
+		return(author)
+
+@contextlib.contextmanager
+def timed_functions(modules,timings):
+	# wrap the *2latex* functions used by make_cv_tables and make_far_tables
+	# so the time spent in each one is added to timings
+	saved = []
+	for module in modules:
+		for name,function in list(vars(module).items()):
+			if not callable(function) or not '2latex' in name:
+				continue
+
+			def wrapper(*args,name=name,function=function,**kwargs):
+				start = time.perf_counter()
+				try:
+					return(function(*args,**kwargs))
+				finally:
+					timings[name] = timings.get(name,0.0) +time.perf_counter() -start
+			saved.append([module,name,function])
+			setattr(module,name,wrapper)
+	try:
+		yield
+	finally:
+		for [module,name,function] in saved:
+			setattr(module,name,function)
+
+def benchmark(nentries,work_dir,verbose=False):
+	# returns a dictionary of stage name: seconds
+	timings = {}
+
+	def run(stage,function,*args):
+		start = time.perf_counter()
+		if verbose:
+			result = function(*args)
+		else:
+			with contextlib.redirect_stdout(io.StringIO()):
+				result = function(*args)
+		timings[stage] = time.perf_counter() -start
+		return(result)
+
+	def add_sections(sections,suffix):
+		# the time of each table of the stage that was just run
+		for name,seconds in sections.items():
+			timings['  ' +name +suffix] = seconds
+		sections.clear()
+
+	data_dir = os.path.join(work_dir,'data' +str(nentries))
+	start = time.perf_counter()
+	cv_dir = make_synthetic_data(data_dir,nentries)
+	timings['generate data'] = time.perf_counter() -start
+
+	cwd = os.getcwd()
+	os.chdir(cv_dir)
+	try:
+		config = create_config('make_cv.cfg')['CV']
+		config['data_dir'] = data_dir
+		config['ReviewsFile'] = os.path.splitext(config['ReviewsFile'])[0] +'.xlsx'
+		bibfile = os.path.join(data_dir,config['ScholarshipFile'])
+		cur_grads = os.path.join(data_dir,config['CurrentGradAdviseesFile'])
+		gradfile = os.path.join(data_dir,config['GradThesesFile'])
+		ugradfile = os.path.join(data_dir,config['UndergradResearchFile'])
+
+		run('load_bib',load_bib,bibfile)
+		bib_database = run('load_bib cached',load_bib,bibfile)
+		run('bib_reader',lambda: list(read_bib_entries(bibfile)))
+
+		profile = importlib.import_module('.google_author',__package__)
+		scholarly = profile.scholarly
+		profile.scholarly = FakeScholarly(bib_database.entries)
+		try:
+			run('bib_add_citations',bib_add_citations,bib_database,'synthetic' +str(nentries))
+		finally:
+			profile.scholarly = scholarly
+		run('bib_add_student_markers',bib_add_student_markers,100,ugradfile,gradfile,cur_grads,bib_database)
+		run('bib_add_keywords',bib_add_keywords,bib_database)
+		run('write_bib',write_bib,bib_database,bibfile)
+
+		sections = {}
+		modules = [importlib.import_module('.make_cv',__package__),importlib.import_module('.make_far',__package__)]
+		with timed_functions(modules,sections):
+			run('make_cv_tables',make_cv_tables,config,'Tables_cv',bib_database)
+			add_sections(sections,'')
+			run('make_far_tables',make_far_tables,config,'Tables_far',bib_database)
+			# the same functions make the far tables, so their rows are marked
+			add_sections(sections,' (far)')
+		run('get_collaborator_list',get_collaborator_list,config,bib_database,'excel')
+	finally:
+		os.chdir(cwd)
+	return(timings)
+
+def main(argv = None):
+	parser = argparse.ArgumentParser(description='This script times the stages of make_cv on made up data')
+	parser.add_argument('-n', '--nentries',nargs='+',type=int,default=[100,1000,10000],help='the numbers of .bib entries to time, default is 100 1000 10000')
+	parser.add_argument('-o', '--output',help='write the times to this .json file')
+	parser.add_argument('-k', '--keep',help='create the data folders here and keep them, default is a temporary folder')
+	parser.add_argument('-v', '--verbose',action='store_true',help='show the output of the stages')
+	args = parser.parse_args(argv)
+
+	global_prefs.quiet = True
+	results = {}
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		# keep the cache of parsed .bib files out of the user's cache
+		cache_dir = global_prefs.cache_dir
+		global_prefs.cache_dir = os.path.join(tmp_dir,'cache')
+		work_dir = os.path.abspath(args.keep) if args.keep is not None else tmp_dir
+		try:
+			for nentries in args.nentries:
+				print('Timing ' +str(nentries) +' entries')
+				results[nentries] = benchmark(nentries,work_dir,args.verbose)
+		finally:
+			global_prefs.cache_dir = cache_dir
+
+	stages = []
+	for timings in results.values():
+		stages += [stage for stage in timings.keys() if not stage in stages]
+	print(f"{'stage':<36}" +''.join([f'{nentries:>12d}' for nentries in results.keys()]))
+	for stage in stages:
+		print(f'{stage:<36}' +''.join([f'{timings[stage]:>12.3f}' if stage in timings else f"{'':>12}" for timings in results.values()]))
+
+	if args.output is not None:
+		with open(args.output,'w') as f:
+			json.dump(results,f,indent=1)
+
+if __name__ == "__main__":
+	main()
@@ -6,16 +6,14 @@
 # pubs2latex_far.py ../../Scholarship/scholarship.bib
 
 import os, sys
-import bibtexparser
-from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.bibdatabase import BibDatabase
-from bibtexparser.customization import convert_to_unicode
-from bibtexparser.bparser import BibTexParser
 from datetime import date
 import argparse
 import numpy as np
 
 from . import global_prefs
+from .bib_io import load_bib
+from .bib_io import get_keyword_index
+from .bib_io import keyword_window
 
 def getyear(paperbibentry):
 	if "year" in paperbibentry.keys(): 
@@ -24,7 +22,7 @@ def getyear(paperbibentry):
 		return(int(paperbibentry["date"][:4]))
 	return(0)
 
-def bib2latex_far(f,inputfile,keywords,years=-1,max_pubs=-1):
+def bib2latex_far(f,bib_database,keywords,years=-1,max_pubs=-1):
 
 	citestring = "fullcite"
 	if global_prefs.usePandoc:
@@ -34,19 +32,6 @@ def bib2latex_far(f,inputfile,keywords,years=-1,max_pubs=-1):
 	if max_pubs < 0:
 		max_pubs = sys.maxsize
 		
-	# homogenize_fields: Sanitize BibTeX field names, for example change `url` to `link` etc.
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.homogenize_fields = False  # no dice
-	tbparser.alt_dict['url'] = 'url'    # this finally prevents change 'url' to 'link'
-
-	try:
-		with open(inputfile,encoding='utf-8') as bibtex_file:
-			bib_database = bibtexparser.load(bibtex_file, tbparser)
-		bib_database.entries = sorted(bib_database.entries, key=lambda k: getyear(k), reverse=True)	
-	except OSError:
-		print("Could not open/read file: " +inputfile)
-		return(nrecord)
-
 	if years > 0:
 		today = date.today()
 		year = today.year
@@ -54,24 +39,19 @@ def bib2latex_far(f,inputfile,keywords,years=-1,max_pubs=-1):
 	else:
 		begin_year = 0
 
+	# the entries of each category are stored newest first so the year window is a slice
+	index = get_keyword_index(bib_database,keywords)
+	matches = {}
+	for etype in keywords:
+		cat_index = index[etype.strip().lower()]
+		nwindow = keyword_window(cat_index,begin_year)
+		matches.update(zip(cat_index['rank'][:nwindow],cat_index['ID'][:nwindow]))
+
 	f.write("\\begin{enumerate}\n")
 
-	for icpbe, paperbibentry in enumerate(bib_database.entries):
-		year = getyear(paperbibentry)
-		if not(year >= begin_year):
-			continue
-	
-		if "keywords" in paperbibentry.keys():
-			kword = str(paperbibentry["keywords"])
-			for count,etype in enumerate(keywords):
-				etype = etype.strip().lower()
-				if kword.lower().find(etype) > -1:
-					f.write("\\item\n\\" +citestring +"{"+paperbibentry["ID"]+"}\n")
-					nrecord += 1
-					break
-		
-		if (nrecord == max_pubs):
-			break
+	for rank in sorted(matches)[:max_pubs]:
+		f.write("\\item\n\\" +citestring +"{"+matches[rank]+"}\n")
+		nrecord += 1
 	
 	f.write("\\end{enumerate}\n")
 	return(nrecord)
@@ -85,10 +65,10 @@ if __name__ == "__main__":
 	parser.add_argument('outputpath',help='the input bibliography file name')         
 	args = parser.parse_args()
 	
-	f = [open(args.outputpath +os.sep +etype+args.ending+".tex", args.append) for count,etype in  enumerate(categories)]	
-	necord = bib2latex_far(f,args.years,args.inputfile)
-	
-	for count,etype in enumerate(categories):
-		f[count].close()
-		if (necord[count] == 0):	
+	bib_database = load_bib(args.inputfile)
+	for etype in global_prefs.pub_categories:
+		f = open(args.outputpath +os.sep +etype+args.ending+".tex", args.append)
+		necord = bib2latex_far(f,bib_database,[etype],years=args.years)
+		f.close()
+		if (necord == 0):	
 			os.remove(args.outputpath +os.sep +etype+args.ending+".tex")
\ No newline at end of file
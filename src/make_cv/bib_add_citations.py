@@ -1,8 +1,5 @@
 #!/usr/bin/env python3
 import json
-from scholarly import scholarly
-from scholarly import ProxyGenerator
-
 import bibtexparser
 from bibtexparser.bwriter import BibTexWriter
 from bibtexparser.bibdatabase import BibDatabase
@@ -18,42 +15,29 @@ import argparse
 # pip3 uninstall urllib3
 # pip3 install 'urllib3<=2'
 
-from .bib_get_entries_orcid import make_bibtex_id_list
-from .bib_get_entries_orcid import make_title_id
+from .bib_identity_index import BibIdentityIndex
+from .bib_identity_index import make_title_id
+from .bib_io import load_bib
+from .bib_io import write_bib
+from .google_author import google_author
+from .google_author import add_google_stats
 
-def bib_add_citations(bibfile,author_id,outputfile,scraper_id=None):
+def bib_add_citations(bib_database,author_id,scraper_id=None,bib_index=None):
 
-	# Set up a ProxyGenerator object to use free proxies
-	# This needs to be done only once per session
-	# Helps avoid google scholar locking out 
-	if scraper_id:
-		pg = ProxyGenerator()
-		success = pg.ScraperAPI(scraper_id)
-		if success:
-			print('ScraperAPI in use')
-			scholarly.use_proxy(pg)
-		
-	# Get Google Scholar Data for Author	
-	author = scholarly.search_author_id(author_id)
-	author = scholarly.fill(author,sections=['indices','publications'])
+	# Get Google Scholar Data for Author (shared with bib_get_entries_google)
+	author = google_author(author_id,scraper_id)
+	if author is None:
+		return
+	add_google_stats(bib_database,author)
 
-	# Load bibfile
-	# homogenize_fields: Sanitize BibTeX field names, for example change `url` to `link` etc.
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.homogenize_fields = False  # no dice
-	tbparser.alt_dict['url'] = 'url'    # this finally prevents change 'url' to 'link'
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bib_database = bibtexparser.load(bibtex_file, tbparser)
 	entries = bib_database.entries
 	
 	# # Create list of titles in bibfile compressing out nonalphanumeric characters
 	# titles = [re.sub('[\\W_]', '', entry['title']).lower() if 'title' in entry.keys() else None for entry in entries]
 
-	# Create list of existing index, title ids, and dois
-	titles = make_bibtex_id_list(entries)
-	
-	# Create list of google publication ids if they exist
-	google_pub_ids = [entry["google_pub_id"] if "google_pub_id" in entry.keys() else None for entry in entries]
+	# Create lookup tables of existing title ids, dois, and google publication ids
+	if bib_index is None:
+		bib_index = BibIdentityIndex(entries)
 
 	# Loop through google scholar entries
 	for pub in author['publications']:
@@ -70,24 +54,25 @@ def bib_add_citations(bibfile,author_id,outputfile,scraper_id=None):
 		# First try to match by publication id
 		au_pub_id = pub['author_pub_id']
 		pub_id = au_pub_id[au_pub_id.find(':')+1:]
-		indices = [i for i, x in enumerate(google_pub_ids) if x == pub_id]
-		if len(indices) == 1:
+		matches = bib_index.find_google_pub_id(pub_id)
+		if len(matches) == 1:
 			# found match
-			entries[indices[0]]['citations'] = str(ncites)
+			matches[0]['citations'] = str(ncites)
 			continue
 		
 		# Try to match by title
 		title_id = make_title_id(pub['bib']['title'],year)
 		citestring = pub['bib']['citation']
 
-		indices = [i for i, x, _ in titles if x == title_id]
-		if len(indices) == 1:
+		matches = bib_index.find_title(title_id)
+		if len(matches) == 1:
 			# found match
-			entries[indices[0]]['citations'] = str(ncites)
-			entries[indices[0]]['google_pub_id'] = str(pub_id)
+			matches[0]['citations'] = str(ncites)
+			matches[0]['google_pub_id'] = str(pub_id)
+			bib_index.add(matches[0])
 			continue
 			
-		if len(indices) > 1:
+		if len(matches) > 1:
 			# try to match something else?
 			# could try secondary matches with these
 			# journal = re.search('^[A-z. ]+',citestring).group(0)
@@ -98,34 +83,30 @@ def bib_add_citations(bibfile,author_id,outputfile,scraper_id=None):
 			if vol:
 				vol = vol.group(0)
 				vol_list = []
-				for i in indices:
-					if "volume" in entries[i].keys():
-						vol_list.append(entries[i]['volume'])
-					elif "pages" in entries[i].keys():
-						pages = re.search('[0-9]+',entries[i]['pages'])
+				for entry in matches:
+					if "volume" in entry.keys():
+						vol_list.append(entry['volume'])
+					elif "pages" in entry.keys():
+						pages = re.search('[0-9]+',entry['pages'])
 						if pages:
-							pages = re.search('[0-9]+',pages.group(0))
-							vol_list.append(pages)
+							vol_list.append(pages.group(0))
 						else:
 							vol_list.append('-1')
+					else:
+						vol_list.append('-1')
 							
-				vol_indices = [i for i, x in enumerate(vol_list) if x == vol]
+				vol_matches = [entry for entry, x in zip(matches,vol_list) if x == vol]
 				
-				if len(vol_indices) == 1:
-					entries[indices[vol_indices[0]]]['citations'] = str(ncites)	
-					entries[indices[vol_indices[0]]]['google_pub_id'] = str(pub_id)				
+				if len(vol_matches) == 1:
+					vol_matches[0]['citations'] = str(ncites)	
+					vol_matches[0]['google_pub_id'] = str(pub_id)
+					bib_index.add(vol_matches[0])
 				else:
 					print('couldnt find unique match based on volume for ' +pub['bib']['title'] +citestring + ' ' +pub_id)
 			else:
 				print('no volumes for ' +pub['bib']['title'] +' ' +citestring + ' ' +pub_id)
 		else:
 			print('no title match for ' +pub['bib']['title'] +' ' +citestring + ' ' +pub_id)
-	
-	writer = BibTexWriter()
-	writer.order_entries_by = None
-	with open(outputfile, 'w',encoding='utf-8') as thebibfile:
-		bibtex_str = bibtexparser.dumps(bib_database,writer)
-		thebibfile.write(bibtex_str)
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description='This script adds citations counts to a bib file')
@@ -139,4 +120,6 @@ if __name__ == "__main__":
 		with open("google_id") as google_file:
 			args.author_id = google_file.readline().strip('\n\r')
 	
-	bib_add_citations(args.bibfile,args.author_id,args.output,args.scraperID)
+	bib_database = load_bib(args.bibfile)
+	bib_add_citations(bib_database,args.author_id,args.scraperID)
+	write_bib(bib_database,args.output)
@@ -16,6 +16,8 @@ from bibtexparser.customization import convert_to_unicode
 from bibtexparser.bparser import BibTexParser
 import argparse
 from . import global_prefs
+from .bib_io import load_bib
+from .bib_io import write_bib
 
 pub_categories = global_prefs.pub_categories +['ignore']
 
@@ -103,15 +105,7 @@ def check_keyword_exists(paperbibentry):
 			return(False)
 	return(True)
 
-def bib_add_keywords(bibfile,outputfile):
-	# homogenize_fields: Sanitize BibTeX field names, for example change `url` to `link` etc.
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.homogenize_fields = False  # no dice
-	tbparser.alt_dict['url'] = 'url'    # this finally prevents change 'url' to 'link'
-	
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bib_database = bibtexparser.load(bibtex_file, tbparser)
-	
+def bib_add_keywords(bib_database):
 	for paperbibentry in bib_database.entries:
 		if "year" in paperbibentry.keys() or "date" in paperbibentry.keys():
 			if not check_keyword_exists(paperbibentry):
@@ -119,20 +113,12 @@ def bib_add_keywords(bibfile,outputfile):
 				add_keyword(paperbibentry)
 	
 	# new_db.entries = sorted(new_db.entries, key=lambda k: int(k["year"]), reverse=True)	
-	
-	writer = BibTexWriter()
-	# writer.contents = ['comments', 'entries']
-	# writer.indent = '  '
-	# writer.order_entries_by = ('year','ENTRYTYPE', 'author')
-	writer.order_entries_by = None
-	
-	with open(outputfile, 'w', encoding='utf-8') as thebibfile:
-		bibtex_str = bibtexparser.dumps(bib_database,writer)
-		thebibfile.write(bibtex_str)
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description='This script guesses the type of each entry and adds the type as a keyword')
 	parser.add_argument('-o', '--output',default="scholarship1.bib",help='the name of the output file')
 	parser.add_argument('bibfile',help='the .bib file to add the markers to')
 	args = parser.parse_args()
-	bib_add_keywords(args.bibfile,args.output)
\ No newline at end of file
+	bib_database = load_bib(args.bibfile)
+	bib_add_keywords(bib_database)
+	write_bib(bib_database,args.output)
\ No newline at end of file
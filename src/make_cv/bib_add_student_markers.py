@@ -20,6 +20,8 @@ import datetime
 from .stringprotect import abbreviate_name
 from .stringprotect import split_names
 from .stringprotect import first_last
+from .bib_io import load_bib
+from .bib_io import write_bib
 
 def getyear(paperbibentry):
 	if "year" in paperbibentry.keys(): 
@@ -28,7 +30,7 @@ def getyear(paperbibentry):
 		return(int(paperbibentry["date"][:4]))
 	return(0)
 
-def bib_add_student_markers(years,ugrads,grads,cur_grad,bibfile,outputfile):
+def bib_add_student_markers(years,ugrads,grads,cur_grad,bib_database):
 	try:
 		cur_grad_names = pd.read_excel(cur_grad,sheet_name="Data",parse_dates=['Start Date'])
 	except OSError:
@@ -77,14 +79,6 @@ def bib_add_student_markers(years,ugrads,grads,cur_grad,bibfile,outputfile):
 	grad_list['Student'] = grad_list['Student'].apply(lambda x : abbreviate_name(x,first_initial_only=True))
 	grad_list = grad_list.pivot_table(values=['Year'], index=['Student'], aggfunc={'Year': 'max'},fill_value=0,observed=False)
 
-	# homogenize_fields: Sanitize BibTeX field names, for example change `url` to `link` etc.
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.homogenize_fields = False  # no dice
-	tbparser.alt_dict['url'] = 'url'    # this finally prevents change 'url' to 'link'
-	
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bib_database = bibtexparser.load(bibtex_file, tbparser)
-	
 	# new_db = BibDatabase()
 	
 	bibdblen = len(bib_database.entries)
@@ -107,12 +101,6 @@ def bib_add_student_markers(years,ugrads,grads,cur_grad,bibfile,outputfile):
 						newauths = newauths +'\\us'
 				spacer = " and "
 			paperbibentry['author'] = newauths
-		
-	writer = BibTexWriter()
-	writer.order_entries_by = None
-	with open(outputfile, 'w', encoding='utf-8') as thebibfile:
-		bibtex_str = bibtexparser.dumps(bib_database,writer)
-		thebibfile.write(bibtex_str)
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser(description='This script adds markers to student authors in a bib file')
@@ -124,7 +112,9 @@ if __name__ == "__main__":
 	parser.add_argument('bibfile',help='the .bib file to add the markers to')
 	args = parser.parse_args()
 	
-	bib_add_student_markers(args.years,args.ugradfile,args.gradfile,args.cur_grads,args.bibfile,args.output)
+	bib_database = load_bib(args.bibfile)
+	bib_add_student_markers(args.years,args.ugradfile,args.gradfile,args.cur_grads,bib_database)
+	write_bib(bib_database,args.output)
 
 		
 		
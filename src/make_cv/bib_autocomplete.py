@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Completes new .bib entries with bibtexautocomplete in batches
+# BibtexAutocomplete runs one thread per lookup source (Crossref, DBLP,
+# OpenAlex, ...) and each thread works through all of the loaded entries, so
+# completing the new entries of a sync together costs about as long as the
+# slowest source takes for them instead of the sum of every source for every
+# entry.  Batches are limited to batch_size entries so a large import shows
+# progress and an interruption loses little.
+
+from bibtexautocomplete import BibtexAutocomplete
+
+batch_size = 50
+
+def count_fields(completer):
+	# number of fields in the first entry of each loaded string
+	return([len(entries[0]) if entries else 0 for entries in completer.write_entry()])
+
+def autocomplete_entries(bibtex_strs,fields_to_overwrite=None):
+	# returns [completed BibTeX string, number of fields added] for each
+	# string in bibtex_strs, in the same order
+	results = []
+	for n in range(0,len(bibtex_strs),batch_size):
+		batch = bibtex_strs[n:n+batch_size]
+		if fields_to_overwrite is None:
+			completer = BibtexAutocomplete()
+		else:
+			completer = BibtexAutocomplete(fields_to_overwrite=fields_to_overwrite)
+		# each string is loaded as its own database so the keys can repeat
+		completer.load_string(list(batch))
+		nfields_before = count_fields(completer)
+		completer.autocomplete()
+		nfields_after = count_fields(completer)
+		for bibtex_str,before,after in zip(completer.write_string(),nfields_before,nfields_after):
+			results.append([bibtex_str,after -before])
+	return(results)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# On-disk cache of parsed .bib files
+# Parsing a large scholarship.bib with bibtexparser takes seconds, so the parsed
+# entries, comments (where Google_stats/Scopus_stats are kept) and derived
+# fields are stored in ~/.cache/make_cv keyed by the content hash of the file
+# and the parser version.  There is one cache file per .bib file, which is
+# overwritten whenever the .bib file changes.
+
+import gzip
+import hashlib
+import os
+import pickle
+
+import bibtexparser
+from bibtexparser.bibdatabase import BibDatabase
+
+from . import global_prefs
+
+# bump this when the layout of the cache or the derived fields change
+CACHE_VERSION = 2
+
+def bib_hash(bibtex_str):
+	return hashlib.sha256(bibtex_str.encode('utf-8')).hexdigest()
+
+def cache_key(content_hash):
+	return (content_hash, str(CACHE_VERSION) +'-' +bibtexparser.__version__)
+
+def cache_file(bibfile):
+	path_id = hashlib.sha1(os.path.abspath(bibfile).encode('utf-8')).hexdigest()[:16]
+	return os.path.join(os.path.expanduser(global_prefs.cache_dir), 'bib_' +path_id +'.pickle.gz')
+
+def read_bib_cache(bibfile,content_hash):
+	# returns (bib_database, derived) or None if there is no valid cache entry
+	try:
+		with gzip.open(cache_file(bibfile),'rb') as f:
+			data = pickle.load(f)
+	except Exception:
+		return None
+
+	if data.get('key') != cache_key(content_hash):
+		return None
+
+	bib_database = BibDatabase()
+	bib_database.entries = data['entries']
+	bib_database.comments = data['comments']
+	bib_database.preambles = data['preambles']
+	bib_database.strings.update(data['strings'])
+	return (bib_database, data['derived'])
+
+def write_bib_cache(bibfile,content_hash,bib_database,derived):
+	data = {'key': cache_key(content_hash),
+			'entries': bib_database.entries,
+			'comments': bib_database.comments,
+			'preambles': bib_database.preambles,
+			'strings': dict(bib_database.strings),
+			'derived': derived}
+
+	filename = cache_file(bibfile)
+	try:
+		os.makedirs(os.path.dirname(filename),exist_ok=True)
+		with gzip.open(filename +'.tmp','wb',compresslevel=1) as f:
+			pickle.dump(data,f,protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(filename +'.tmp',filename)
+	except (OSError, pickle.PicklingError) as err:
+		# the cache is only an optimization
+		print('Could not write bibliography cache: ' +str(err))
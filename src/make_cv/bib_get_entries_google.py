@@ -2,7 +2,6 @@
 import json
 import os
 from scholarly import scholarly
-from scholarly import ProxyGenerator
 
 import bibtexparser
 from bibtexparser.bwriter import BibTexWriter
@@ -10,7 +9,6 @@ from bibtexparser.bibdatabase import BibDatabase
 from bibtexparser.customization import convert_to_unicode
 from bibtexparser.bparser import BibTexParser
 from bibtexautocomplete.core import main as btac
-from bibtexautocomplete import BibtexAutocomplete
 
 from .stringprotect import str2latex
 from .stringprotect import last_first
@@ -22,18 +20,26 @@ import argparse
 from datetime import date
 import sys
 
-from .bib_add_keywords import add_keyword
-from .bib_get_entries_orcid import make_bibtex_id_list
-from .bib_get_entries_orcid import make_title_id
+from .bib_identity_index import BibIdentityIndex
+from .bib_identity_index import make_title_id
 from .bib_get_entries_orcid import getyear
 from .bib_get_entries_uspto_odp import lookup_application
 from .bib_get_entries_uspto_odp import lookup_patent
 from .bib_get_entries_uspto_odp import lookup_publication	
+from .bib_autocomplete import autocomplete_entries
+from .review_queue import review_entries
+from .sync_state import SyncState
+from .sync_state import save_sync_states
 
 from bs4 import BeautifulSoup
-import requests
 
 from . import global_prefs
+from . import http_client
+from .google_author import google_author
+from .google_author import add_google_stats
+from .bib_io import load_bib
+from .bib_io import add_bib_entries
+from .bib_io import write_bib
 
 # copied from http://myhttpheader.com
 myRequestHeader = {
@@ -53,27 +59,14 @@ def process_entry(paperbibentry,pub_id,year):
 	elif 'note' in paperbibentry.keys():
 		paperbibentry['ENTRYTYPE'] = 'misc'
 	paperbibentry['google_pub_id'] = pub_id
-	add_keyword(paperbibentry)
 	title_str = paperbibentry.get('title', '') or ''
 	paperbibentry['ID'] = make_title_id(title_str,str(year))
 
-def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=None):
+def bib_get_entries_google(bib_database, author_id, years, scraper_id=None, bib_index=None):
 	
-	# Set up a ProxyGenerator object to use free proxies
-	# This needs to be done only once per session
-	# Helps avoid Google Scholar locking out 
-	if scraper_id:
-		pg = ProxyGenerator()
-		success = pg.ScraperAPI(scraper_id)
-		if success:
-			print('ScraperAPI in use')
-			scholarly.use_proxy(pg)
-	
-	# Get Google Scholar Data for Author
-	try:
-		author = scholarly.search_author_id(author_id)
-	except Exception:
-		print('Error retrieving author from Google Scholar: ' + str(author_id))
+	# Get Google Scholar Data for Author (shared with bib_add_citations)
+	author = google_author(author_id, scraper_id)
+	if author is None:
 		return
 	
 	author_name = author.get('name')
@@ -82,15 +75,6 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 		print('Could not find author name for id: ' + author_id)
 	else:
 		last_name = last_first(author_name).split(',')[0]
-
-	author = scholarly.fill(author, sections=['indices', 'publications'])
-	
-	author_stats =	{'i10index': author.get('i10index'), 
-					'hindex': author.get('hindex'), 
-					'citedby': author.get('citedby'), 
-					'hindex5y': author.get('hindex5y'), 
-					'i10index5y': author.get('i10index5y'), 
-					'citedby5y': author.get('citedby5y')}
 	
 	# Set starting year for search
 	if years > 0:
@@ -100,25 +84,21 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 	else:
 		begin_year = 0
 		
-	# Load bibfile
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.alt_dict['url'] = 'url'	# this prevents change 'url' to 'link'
-	tbparser.expect_multiple_parse = True
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bib_database = bibtexparser.load(bibtex_file, tbparser)
 	entries = bib_database.entries
 
 	# Add stats as comment to bib_database
-	bib_database.comments = [c for c in bib_database.comments if not c.startswith('Google_stats')]
-	bib_database.comments.append('Google_stats: ' + json.dumps(author_stats))
+	add_google_stats(bib_database, author)
 
-	# Create list of existing index, title ids, and dois
-	bib_entry_ids = make_bibtex_id_list(entries)
+	# Create lookup tables of existing title ids, dois, and google publication ids
+	if bib_index is None:
+		bib_index = BibIdentityIndex(entries)
 	
-	# Create list of google publication ids if they exist
-	google_pub_ids = [entry["google_pub_id"] if "google_pub_id" in entry.keys() else None for entry in entries]
+	# Publications dealt with in earlier runs
+	sync = SyncState('google', author_id)
 	
-	# Loop through Google Scholar entries
+	# Loop through Google Scholar entries collecting the new ones
+	candidates = []
+	seen = set()
 	for pub in author['publications']:
 		if 'pub_year' in pub['bib']:
 			year = pub['bib']['pub_year']
@@ -131,14 +111,23 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 		# Skip if matching publication id
 		au_pub_id = pub['author_pub_id']
 		pub_id = au_pub_id[au_pub_id.find(':') + 1:]
-		if pub_id in google_pub_ids:
+		if sync.done(pub_id):
+			continue
+		if bib_index.find_google_pub_id(pub_id):
+			sync.mark(pub_id)
 			continue
 
 		# Skip if matching title/date string
 		title_id = make_title_id(pub['bib']['title'],year)
-		if any(title_id == entry_title_id for _, entry_title_id, _ in bib_entry_ids):
+		if bib_index.find_title(title_id):
 			print('Skipped entry since title/year already exists')
+			sync.mark(pub_id)
 			continue
+		# another version of an entry of this run is only marked once that
+		# entry is in the .bib file
+		if title_id in seen:
+			continue
+		seen.add(title_id)
 
 		################  Using bibtex autocomplete ########################
 		print('Trying to complete this record:')
@@ -168,8 +157,10 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 				
 				if bibtex_str is not None:
 					print('Patent found:\n ' + bibtex_str)
-					bib_database_patent = bibtexparser.loads(bibtex_str, tbparser)
-					bib_database_patent.entries[-1]['google_pub_id'] = pub_id
+					add_bib_entries(bib_database, bibtex_str)
+					bib_database.entries[-1]['google_pub_id'] = pub_id
+					bib_index.add(bib_database.entries[-1])
+					sync.mark(pub_id)
 					continue
 				else:
 					print('Patent not found: ' + num_search.group(1))
@@ -181,21 +172,24 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 			nentries = 3
 		else:
 			bibstring = '@article{' + pub_id + ',\n title={' + pub['bib']['title'] + '},\n year={' + pub['bib']['pub_year'] + '}\n}'
+		candidates.append([pub, pub_id, year, title_id, bibstring])
 
-		# Try to fill entry using BibTeX autocomplete
-		completer = BibtexAutocomplete(fields_to_overwrite=set(['type','author']))
-		completer.load_string(bibstring)
-		nfields_before = len(completer.write_entry()[0][0])
-		completer.autocomplete()
-		nfields_after = len(completer.write_entry()[0][0])
+	# Try to fill all of the new entries at once using BibTeX autocomplete
+	completed = autocomplete_entries([candidate[4] for candidate in candidates], fields_to_overwrite=set(['type','author']))
 
-		bibtex_str = completer.write_string()[0]
+	# Entries to review once all of them have been looked up
+	to_review = []
+	review_ids = []
+	for [pub, pub_id, year, title_id, bibstring], [bibtex_str, nfields_added] in zip(candidates, completed):
+		def prepare(paperbibentry,pub_id=pub_id,year=year):
+			process_entry(paperbibentry,pub_id,year)
 
 		author_match = re.search(r'(?:,|\n)\s*author\s*=\s*{(.+?)}', bibtex_str)
-		if author_match and nfields_after > nfields_before:
+		if author_match and nfields_added > 0:
 			authors = author_match.group(1)
 			if authors.find(last_name) == -1:
 				print('Skipped entry since last name ' + last_name + ' not found in authors: ' + authors)
+				sync.mark(pub_id)
 				continue
 
 			doi_match = re.search(r'(?:,|\n)\s*doi\s*=\s*{(.+?)}', bibtex_str)
@@ -203,21 +197,14 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 			doi = None
 			if doi_match:
 				doi = doi_match.group(1).lower()
-				if any(entry_doi and doi == entry_doi for _, _, entry_doi in bib_entry_ids):
+				if bib_index.find_doi(doi):
 					print('Skipped entry since doi already exists')
+					sync.mark(pub_id)
 					continue
 					
-			bibtex_str = str2latex(bibtex_str)
-			bib_database = bibtexparser.loads(bibtex_str, tbparser)
-			print(BibTexWriter()._entry_to_bibtex(bib_database.entries[-1]))
-			YN = 'Y'
-			if not global_prefs.quiet:
-				YN = input('Is this entry correct and ready to be added?\nOnce an entry is added any changes must be done manually.\n[Y/N]?')
-			if YN.upper() == 'Y':
-				process_entry(bib_database.entries[-1],pub_id,year)
-				continue
-			else:
-				bib_database.entries.pop()
+			to_review.append([str2latex(bibtex_str), prepare])
+			review_ids.append(pub_id)
+			continue
 		else:
 			print('BibTeX Autocomplete failed: missing author or title or year')
 		
@@ -228,7 +215,7 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 			if 'url_related_articles' in pub_filled.keys():
 				scholar_id = pub_filled['url_related_articles'].split("q=related:")[1].split(":")[0]
 				output_query = f"https://scholar.google.com/scholar?hl=en&q=info:{scholar_id}:scholar.google.com/&output=cite&scirp=0&hl=en"
-				response = requests.get(output_query,headers=myRequestHeader)
+				response = http_client.get(output_query,source='google',headers=myRequestHeader)
 				soup = BeautifulSoup(response.content, 'html.parser')
 				# Find link to BibTeX
 				a_tag = soup.find("a", class_="gs_citi")
@@ -236,7 +223,7 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 					bibtex_url = a_tag["href"]
 				elif scraper_id:
 					payload = { 'api_key': scraper_id, 'url': output_query}
-					response = requests.get('https://api.scraperapi.com/', params=payload)
+					response = http_client.get('https://api.scraperapi.com/',source='scraperapi',params=payload)
 					if a_tag and a_tag.get("href"):
 						bibtex_url = a_tag["href"]
 					else:
@@ -247,11 +234,11 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 					continue
 				
 				# try to follow BibTeX link to get citation
-				response = requests.get(bibtex_url,headers=myRequestHeader)
+				response = http_client.get(bibtex_url,source='google',headers=myRequestHeader)
 				if (response.text.find('Error 403 (Forbidden)') > -1):
 					if scraper_id:
 						payload = { 'api_key': scraper_id, 'url': bibtex_url}
-						response = requests.get('https://api.scraperapi.com/', params=payload)
+						response = http_client.get('https://api.scraperapi.com/',source='scraperapi',params=payload)
 						if (response.text.find('Error 403 (Forbidden)') > -1) and scraper_id:
 							print('Scraper got blocked: ' +bibtex_url)
 							continue
@@ -260,21 +247,13 @@ def bib_get_entries_google(bibfile, author_id, years, outputfile, scraper_id=Non
 						continue				
 				
 				# Process response
-				bibtex_str = response.text
-				print(bibtex_str)
-				YN = 'Y'
-				if not global_prefs.quiet:
-					YN = input('Is this entry correct and ready to be added?\nOnce an entry is added any changes must be done manually.\n[Y/N]?')
-				if YN.upper() == 'Y':
-					bib_database = bibtexparser.loads(bibtex_str, tbparser)
-					process_entry(bib_database.entries[-1],pub_id,year)				
-					continue
+				to_review.append([response.text, prepare])
+				review_ids.append(pub_id)
 	
-	writer = BibTexWriter()
-	writer.order_entries_by = None
-	with open(outputfile, 'w',encoding='utf-8') as thebibfile:
-		bibtex_str = bibtexparser.dumps(bib_database, writer)
-		thebibfile.write(bibtex_str)
+	done = review_entries(bib_database, bib_index, to_review)
+	for pub_id, reviewed in zip(review_ids, done):
+		if reviewed:
+			sync.mark(pub_id)
 	
 	for file in ['dump.text', 'btac.bib']:
 		try:
@@ -296,4 +275,7 @@ if __name__ == "__main__":
 		with open("google_id") as google_file:
 			args.author_id = google_file.readline().strip('\n\r')
 		
-	bib_get_entries_google(args.bibfile,args.author_id,args.years,args.output,args.scraperID)
\ No newline at end of file
+	bib_database = load_bib(args.bibfile)
+	bib_get_entries_google(bib_database,args.author_id,args.years,args.scraperID)
+	write_bib(bib_database,args.output)
+	save_sync_states()
\ No newline at end of file
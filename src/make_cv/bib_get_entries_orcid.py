@@ -7,6 +7,7 @@ import argparse
 from datetime import date
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 import re
@@ -14,37 +15,19 @@ import re
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
 from bibtexparser.bwriter import BibTexWriter
-from bibtexautocomplete import BibtexAutocomplete
 
 from .stringprotect import str2latex
-from pylatexenc.latex2text import LatexNodes2Text
+from .bib_identity_index import BibIdentityIndex
+from .bib_identity_index import make_title_id
+from .bib_autocomplete import autocomplete_entries
+from .review_queue import review_entries
+from .sync_state import SyncState
+from .sync_state import save_sync_states
 
 from . import global_prefs
-
-def make_title_id(title, year):
-	# Strip braces and other BibTeX bracketing
-	title_string = LatexNodes2Text().latex_to_text(title).lower()
-	title_id = re.sub(r"[^a-z0-9]+", "", title_string)
-	title_id += str(year)
-	return title_id
-
-def make_bibtex_id_list(entries):
-	parsed_entries = []
-	for i, entry in enumerate(entries):
-		title = entry.get('title') or entry.get('TITLE')
-		if title is None:
-			continue
-		year_str = getyear(entry)
-
-		# Strip braces and other BibTeX bracketing
-		title_id = make_title_id(title,year_str)
-
-		doi = entry.get('doi') or entry.get('DOI')
-		doi_val = doi.lower() if doi else None
-		parsed_entries.append((i, title_id, doi_val))
-
-	return parsed_entries
-
+from . import http_client
+from .bib_io import load_bib
+from .bib_io import write_bib
 
 def getyear(paperbibentry):
 	if "year" in paperbibentry.keys(): 
@@ -60,6 +43,10 @@ def getyear(paperbibentry):
 
 ORCID_API = "https://pub.orcid.org/v3.0"
 HEADERS_ORCID = {"Accept": "application/json"}
+# The public API allows 100 works per bulk request (the request rate is
+# limited in http_client)
+ORCID_BULK_SIZE = 100
+ORCID_WORKERS = 4
 BIBTEX_TYPE_MAP = {
 	"journal-article": "article",
 	"conference-paper": "inproceedings",
@@ -102,7 +89,7 @@ def normalize_bibtex(bib):
 def get_all_works(orcid):
 	url = f"{ORCID_API}/{orcid}/works"
 	try:
-		r = requests.get(url, headers=HEADERS_ORCID, timeout=10)
+		r = http_client.get(url, source="orcid", headers=HEADERS_ORCID)
 		r.raise_for_status()
 		return r.json().get("group", [])
 	except requests.RequestException as exc:
@@ -113,7 +100,7 @@ def get_all_works(orcid):
 def get_work(orcid, put_code):
 	url = f"{ORCID_API}/{orcid}/work/{put_code}"
 	try:
-		r = requests.get(url, headers=HEADERS_ORCID, timeout=10)
+		r = http_client.get(url, source="orcid", headers=HEADERS_ORCID)
 		r.raise_for_status()
 		return r.json()
 	except requests.RequestException as exc:
@@ -121,6 +108,41 @@ def get_work(orcid, put_code):
 		return None
 
 
+def get_works_bulk(orcid, put_codes):
+	# returns {put_code: work} for the works the bulk endpoint returned
+	url = f"{ORCID_API}/{orcid}/works/" +",".join(str(code) for code in put_codes)
+	try:
+		r = http_client.get(url, source="orcid", headers=HEADERS_ORCID, timeout=30)
+		r.raise_for_status()
+		bulk = r.json().get("bulk", [])
+	except (requests.RequestException, ValueError) as exc:
+		print(f"Failed to fetch ORCID works in bulk for {orcid}: {exc}")
+		return {}
+
+	works = {}
+	for item in bulk:
+		work = item.get("work")
+		if work and work.get("put-code") is not None:
+			works[work["put-code"]] = work
+	return works
+
+
+def get_works(orcid, put_codes):
+	# fetch full records, 100 at a time from the bulk endpoint, then any the
+	# bulk requests missed one at a time from a few threads
+	works = {}
+	for n in range(0, len(put_codes), ORCID_BULK_SIZE):
+		works.update(get_works_bulk(orcid, put_codes[n:n+ORCID_BULK_SIZE]))
+
+	missing = [code for code in put_codes if not code in works]
+	if missing:
+		with ThreadPoolExecutor(max_workers=ORCID_WORKERS) as pool:
+			for code, work in zip(missing, pool.map(lambda code: get_work(orcid, code), missing)):
+				if work:
+					works[code] = work
+	return works
+
+
 def extract_doi(work):
 	exts = safe_value(work, "external-ids", "external-id") or []
 	for ext in exts:
@@ -221,7 +243,7 @@ def bibtex_entry(work):
 	bib.append("}\n")
 	return "\n".join(bib)
 
-def bib_get_entries_orcid(bibfile, orcid, years, outputfile):
+def bib_get_entries_orcid(bib_database, orcid, years, bib_index=None):
 
 	# Set starting year for search
 	if years > 0:
@@ -232,20 +254,22 @@ def bib_get_entries_orcid(bibfile, orcid, years, outputfile):
 		begin_year = 0
 		
 	# get list of publication identifiers in existing file
-	tbparser = BibTexParser(common_strings=True)
-	tbparser.alt_dict['url'] = 'url'	# this prevents change 'url' to 'link'
-	tbparser.expect_multiple_parse = True
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bib_database = bibtexparser.load(bibtex_file, tbparser)
-	entries = bib_database.entries
-	bib_entry_ids = make_bibtex_id_list(entries)
+	if bib_index is None:
+		bib_index = BibIdentityIndex(bib_database.entries)
 		
 	# Get all works from orcid
 	groups = get_all_works(orcid)
 	if not groups:
 		print(f"No works returned for ORCID {orcid}")
 		return
+	
+	# Works dealt with in earlier runs, with their last-modified-date
+	sync = SyncState("orcid", orcid)
 
+	# The work summaries in the /works response have the title, date and
+	# external ids, so only works that are not already in the .bib file
+	# need to be fetched in full
+	new_works = []
 	for group in groups:
 		summaries = group.get("work-summary") or []
 		if not summaries:
@@ -254,62 +278,66 @@ def bib_get_entries_orcid(bibfile, orcid, years, outputfile):
 		put_code = summary.get("put-code")
 		if not put_code:
 			continue
-		work = get_work(orcid, put_code)
-		if not work:
+		# Skip works seen before that have not changed since
+		modified = safe_value(summary, "last-modified-date", "value")
+		if sync.done(put_code, modified):
 			continue
-		year = extract_publication_year(work)
+		year = extract_publication_year(summary)
 		if year is None or int(year) < begin_year:
 			continue
 		
-		
 		# Skip entries that have matching doi database
-		doi = extract_doi(work)
-		if doi is not None:
-			if any(doi.lower() == entry_doi for _, _, entry_doi in bib_entry_ids):
-				continue
+		# (the group ids combine the ids of all versions of the work)
+		doi = extract_doi(group) or extract_doi(summary)
+		if bib_index.find_doi(doi):
+			sync.mark(put_code, modified)
+			continue
 		
-		title = safe_value(work, "title", "title", "value")
+		title = safe_value(summary, "title", "title", "value")
 		if not title:
 			continue
 		title_id = make_title_id(title,str(year))
 	
 		# Skip entries that have matching title+year database
-		matched = False
-		for i, entry_title_id, _ in bib_entry_ids:
-			if title_id == entry_title_id:
-				if doi is not None:
-					print(f"Adding DOI {doi} to existing entry {title_id}")
-					entries[i]["doi"] = doi
-				matched = True
-				break
-		if matched:
+		matches = bib_index.find_title(title_id)
+		if matches:
+			if doi is not None:
+				print(f"Adding DOI {doi} to existing entry {title_id}")
+				matches[0]["doi"] = doi
+				bib_index.add(matches[0])
+			sync.mark(put_code, modified)
 			continue
-			
-		# New entry
-		new_entry = bibtex_entry(work)
-		
-		# Try to fill entry using BibTeX autocomplete
-		completer = BibtexAutocomplete()
-		completer.load_string(new_entry)
-		completer.autocomplete()
-		
-		bibtex_str = completer.write_string()[0]
-		bibtex_str = str2latex(bibtex_str)
-		print(bibtex_str)
-		
-		if not global_prefs.quiet:
-			print('Is this btac entry correct and ready to be added?\nOnce an entry is added any future changes must be done manually.')
-			YN = input('Y/N? ')
-			if YN.upper() != 'Y':
-				continue
 		
-		bib_database = bibtexparser.loads(bibtex_str, tbparser)	
-
-	writer = BibTexWriter()
-	writer.order_entries_by = None
-	with open(outputfile, 'w',encoding='utf-8') as thebibfile:
-		bibtex_str = bibtexparser.dumps(bib_database, writer)
-		thebibfile.write(bibtex_str)
+		new_works.append([put_code, modified, doi, title_id])
+	
+	if not new_works:
+		return
+	works = get_works(orcid, [put_code for [put_code, modified, doi, title_id] in new_works])
+	
+	# New entries, once for each work even if ORCID has several versions
+	candidates = []
+	seen = set()
+	for [put_code, modified, doi, title_id] in new_works:
+		work = works.get(put_code)
+		if not work:
+			continue
+		# the other versions are marked in a later run, once the .bib file
+		# has the entry
+		if title_id in seen or (doi is not None and doi.lower() in seen):
+			continue
+		seen.add(title_id)
+		if doi is not None:
+			seen.add(doi.lower())
+		candidates.append([put_code, modified, bibtex_entry(work)])
+	
+	# Try to fill all of the entries at once using BibTeX autocomplete
+	completed = autocomplete_entries([new_entry for [put_code, modified, new_entry] in candidates])
+	
+	# Then ask about all of them
+	done = review_entries(bib_database, bib_index, [[str2latex(bibtex_str), None] for [bibtex_str, nfields_added] in completed])
+	for [put_code, modified, new_entry], reviewed in zip(candidates, done):
+		if reviewed:
+			sync.mark(put_code, modified)
 
 	#cleanup
 	for file in ['dump.text', 'btac.bib']:
@@ -327,7 +355,10 @@ if __name__ == "__main__":
 	parser.add_argument('-oid', '--orcid', default="", help='The ORCID for the author.')
 	args = parser.parse_args()
 
-	bib_get_entries_orcid(args.bibfile, args.orcid, args.years, args.output)
+	bib_database = load_bib(args.bibfile)
+	bib_get_entries_orcid(bib_database, args.orcid, args.years)
+	write_bib(bib_database, args.output)
+	save_sync_states()
 
 
 
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import io
 import os
 import re
 import argparse
@@ -9,17 +10,23 @@ import xml.etree.ElementTree as ET
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
 from bibtexparser.bwriter import BibTexWriter
-from bibtexautocomplete import BibtexAutocomplete
 
 from pylatexenc.latex2text import LatexNodes2Text
 
 from .stringprotect import str2latex
 from . import global_prefs
+from . import http_client
+from .bib_io import load_bib
+from .bib_io import write_bib
 
 from .bib_add_keywords import add_keyword
-from .bib_get_entries_orcid import make_bibtex_id_list
-from .bib_get_entries_orcid import make_title_id
+from .bib_identity_index import BibIdentityIndex
+from .bib_identity_index import make_title_id
 from .bib_get_entries_orcid import getyear
+from .bib_autocomplete import autocomplete_entries
+from .review_queue import review_entries
+from .sync_state import SyncState
+from .sync_state import save_sync_states
 
 
 # -------------------------------
@@ -27,29 +34,78 @@ from .bib_get_entries_orcid import getyear
 # -------------------------------
 
 BASE = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+BATCH_SIZE = 200
 
 
-def pubmed_author_search(author_name):
+def pubmed_author_search(author_name, begin_year=0):
+    # Leaves the matching PMIDs on the history server and returns
+    # (count, WebEnv, query_key) for fetching them.  The search decides what
+    # is new so it is always sent (the cached one is only used offline)
     params = {
         "db": "pubmed",
         "term": f"{author_name}[Author]",
-        "retmax": 500,
+        "usehistory": "y",
+        "retmax": 0,
         "retmode": "json",
     }
-    r = requests.get(BASE + "esearch.fcgi", params=params)
+    if begin_year > 0:
+        params["datetype"] = "pdat"
+        params["mindate"] = str(begin_year)
+        params["maxdate"] = str(date.today().year + 1)
+    r = http_client.get(BASE + "esearch.fcgi", source="pubmed", refresh=True, params=params)
     r.raise_for_status()
-    return r.json()["esearchresult"]["idlist"]
+    result = r.json()["esearchresult"]
+    return int(result["count"]), result["webenv"], result["querykey"]
 
 
-def pubmed_fetch_record(pmid):
+def pubmed_fetch_batch(webenv, query_key, retstart):
+    # Yields the PubmedArticle elements of one batch from the history server
     params = {
         "db": "pubmed",
-        "id": pmid,
+        "WebEnv": webenv,
+        "query_key": query_key,
+        "retstart": retstart,
+        "retmax": BATCH_SIZE,
         "retmode": "xml",
     }
-    r = requests.get(BASE + "efetch.fcgi", params=params)
+    # the WebEnv changes with every search so the batches are not cached
+    r = http_client.get(BASE + "efetch.fcgi", source="pubmed", cache=False, params=params)
     r.raise_for_status()
-    return ET.fromstring(r.text)
+    for event, elem in ET.iterparse(io.BytesIO(r.content), events=("end",)):
+        if elem.tag == "PubmedArticle":
+            yield elem
+            elem.clear()
+        elif elem.tag == "ERROR":
+            raise ValueError(elem.text)
+
+
+def pubmed_articles(author_name, begin_year=0):
+    # Yields the articles found for the author BATCH_SIZE at a time
+    try:
+        count, webenv, query_key = pubmed_author_search(author_name, begin_year)
+    except (requests.RequestException, KeyError, ValueError) as exc:
+        print(f"PubMed search for {author_name} failed: {exc}")
+        return
+
+    refreshed = False
+    retstart = 0
+    while retstart < count:
+        try:
+            yield from pubmed_fetch_batch(webenv, query_key, retstart)
+        except (requests.RequestException, ET.ParseError, ValueError) as exc:
+            if refreshed:
+                print(f"PubMed fetch for {author_name} failed: {exc}")
+                return
+            # the history server forgets a search after a few hours, search
+            # again once
+            try:
+                count, webenv, query_key = pubmed_author_search(author_name, begin_year)
+            except (requests.RequestException, KeyError, ValueError) as exc:
+                print(f"PubMed search for {author_name} failed: {exc}")
+                return
+            refreshed = True
+            continue
+        retstart += BATCH_SIZE
 
 
 def pubmed_metadata(article_xml):
@@ -133,6 +189,10 @@ def build_bibtex(article_xml):
     if doi:
         bib.append(f"  doi     = {{{doi}}},")
 
+    pmid = article_xml.find(".//PMID")
+    if pmid is not None:
+        bib.append(f"  pmid    = {{{pmid.text}}},")
+
     if len(bib) > 1:
         bib[-1] = bib[-1].rstrip(",")
 
@@ -144,24 +204,32 @@ def build_bibtex(article_xml):
 # Main routine
 # -------------------------------
 
-def bib_get_entries_pubmed(bibfile, author_name, years, outputfile):
+def bib_get_entries_pubmed(bib_db, author_name, years, bib_index=None):
 
     begin_year = date.today().year - years if years > 0 else 0
 
-    tbparser = BibTexParser(common_strings=True)
-    tbparser.expect_multiple_parse = True
-
-    with open(bibfile, encoding="utf-8") as f:
-        bib_db = bibtexparser.load(f, tbparser)
-
-    entries = bib_db.entries
-    existing_ids = make_bibtex_id_list(entries)
-
-    pmids = pubmed_author_search(author_name)
-
-    for pmid in pmids:
+    if bib_index is None:
+        bib_index = BibIdentityIndex(bib_db.entries)
+
+    # Articles seen or rejected in earlier runs
+    sync = SyncState("pubmed", author_name)
+
+    # Collect the new articles then complete them all at once
+    candidates = []
+    seen = set()
+    # a batch that fails partway is fetched again, so its first articles
+    # can come twice
+    pmids = set()
+    for xml_root in pubmed_articles(author_name, begin_year):
+        pmid = xml_root.findtext(".//PMID")
+        if pmid in pmids or sync.done(pmid):
+            continue
+        if pmid is not None:
+            pmids.add(pmid)
+        if bib_index.find_pmid(pmid):
+            sync.mark(pmid)
+            continue
         try:
-            xml_root = pubmed_fetch_record(pmid)
             meta = pubmed_metadata(xml_root)
         except Exception:
             continue
@@ -172,35 +240,27 @@ def bib_get_entries_pubmed(bibfile, author_name, years, outputfile):
         title_id = make_title_id(meta["title"], meta["year"])
 
         # DOI duplicate check
-        if meta["doi"] and any(meta["doi"].lower() == d for _, _, d in existing_ids):
+        if bib_index.find_doi(meta["doi"]):
+            sync.mark(pmid)
             continue
 
         # Title/year duplicate check
-        if any(title_id == t for _, t, _ in existing_ids):
+        if bib_index.find_title(title_id):
+            sync.mark(pmid)
             continue
+        if title_id in seen:
+            continue
+        seen.add(title_id)
 
-        bib = build_bibtex(xml_root)
-
-        completer = BibtexAutocomplete()
-        completer.load_string(bib)
-        completer.autocomplete()
-        bib = completer.write_string()[0]
-        bib = str2latex(bib)
-
-        print(bib)
-
-        if not global_prefs.quiet:
-            yn = input("Add this entry? Y/N ").upper()
-            if yn != "Y":
-                continue
-
-        bib_db = bibtexparser.loads(bib, tbparser)
+        candidates.append([pmid, build_bibtex(xml_root)])
 
-    writer = BibTexWriter()
-    writer.order_entries_by = None
+    completed = autocomplete_entries([bib for [pmid, bib] in candidates])
 
-    with open(outputfile, "w", encoding="utf-8") as f:
-        f.write(bibtexparser.dumps(bib_db, writer))
+    # Then ask about all of them
+    done = review_entries(bib_db, bib_index, [[str2latex(bib), None] for [bib, nfields_added] in completed])
+    for [pmid, bib], reviewed in zip(candidates, done):
+        if reviewed:
+            sync.mark(pmid)
 
 
 # -------------------------------
@@ -215,4 +275,7 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--output", default="pubmed.bib")
     args = parser.parse_args()
 
-    bib_get_entries_pubmed(args.bibfile, args.author, args.years, args.output)
\ No newline at end of file
+    bib_db = load_bib(args.bibfile)
+    bib_get_entries_pubmed(bib_db, args.author, args.years)
+    write_bib(bib_db, args.output)
+    save_sync_states()
\ No newline at end of file
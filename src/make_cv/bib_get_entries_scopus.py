@@ -5,11 +5,11 @@ import argparse
 import json
 
 from datetime import date
+from concurrent.futures import ThreadPoolExecutor
 
 import bibtexparser
 from bibtexparser.bparser import BibTexParser
 from bibtexparser.bwriter import BibTexWriter
-from bibtexautocomplete import BibtexAutocomplete
 
 from pylatexenc.latex2text import LatexNodes2Text
 
@@ -17,22 +17,39 @@ from pybliometrics.scopus import AuthorRetrieval, AuthorSearch, AbstractRetrieva
 
 from .stringprotect import str2latex
 from . import global_prefs
+from .bib_io import load_bib
+from .bib_io import write_bib
 
 from .bib_add_keywords import add_keyword
-from .bib_get_entries_orcid import make_bibtex_id_list
-from .bib_get_entries_orcid import make_title_id
+from .bib_identity_index import BibIdentityIndex
+from .bib_identity_index import make_title_id
 from .bib_get_entries_orcid import getyear
+from .bib_autocomplete import autocomplete_entries
+from .review_queue import review_entries
+from .sync_state import SyncState
+from .sync_state import save_sync_states
 
 # -------------------------------
 # Scopus helpers
 # -------------------------------
 
+# number of abstracts retrieved at once
+SCOPUS_WORKERS = 3
+
 def scopus_author_id_from_name(name):
     res = AuthorSearch(name)
     if not res.authors:
         return None
     return res.authors[0].author_id
 
+def retrieve_abstract(eid):
+    try:
+        return AbstractRetrieval(eid, view="FULL")
+    except Exception as exc:
+        print(f"Unable to retrieve Scopus abstract {eid}: {exc}")
+        return None
+
+
 def scopus_metadata(ab):
     return {
         "title": ab.title,
@@ -110,18 +127,16 @@ def build_bibtex(ab):
 # Main routine
 # -------------------------------
 
-def bib_get_entries_scopus(bibfile, author_id, years, outputfile):
+def bib_get_entries_scopus(bib_db, author_id, years, bib_index=None, refresh=10):
+    # refresh is how many days pybliometrics keeps the author's document list
 
     begin_year = date.today().year - years if years > 0 else 0
 
-    tbparser = BibTexParser(common_strings=True)
-    tbparser.expect_multiple_parse = True
+    if bib_index is None:
+        bib_index = BibIdentityIndex(bib_db.entries)
 
-    with open(bibfile, encoding="utf-8") as f:
-        bib_db = bibtexparser.load(f, tbparser)
-
-    entries = bib_db.entries
-    existing_ids = make_bibtex_id_list(entries)
+    # Documents seen or rejected in earlier runs
+    sync = SyncState("scopus", author_id)
 
     try:
         author = AuthorRetrieval(author_id)
@@ -138,11 +153,39 @@ def bib_get_entries_scopus(bibfile, author_id, years, outputfile):
     bib_db.comments = [c for c in bib_db.comments if not c.startswith('Scopus_stats')]
     bib_db.comments.append('Scopus_stats: ' + json.dumps(author_stats))
     
-    eids = author.get_documents(refresh=10)
-    for doc in eids:
-        # Extract a usable identifier (EID/Scopus ID/DOI) from the returned document
-        eid_val = getattr(doc, "eid")
-        ab = AbstractRetrieval(eid_val, view="FULL")
+    # The document list already has the cover date, DOI and title so
+    # only the abstracts of new documents need to be retrieved
+    new_eids = []
+    listed = set()
+    for doc in author.get_documents(refresh=refresh):
+        eid_val = getattr(doc, "eid", None)
+        if not eid_val or eid_val in listed or sync.done(eid_val):
+            continue
+        listed.add(eid_val)
+        if bib_index.find_eid(eid_val):
+            sync.mark(eid_val)
+            continue
+        year = (getattr(doc, "coverDate", None) or "")[:4]
+        if not year.isdigit() or int(year) < begin_year:
+            continue
+        if bib_index.find_doi(getattr(doc, "doi", None)):
+            sync.mark(eid_val)
+            continue
+        if getattr(doc, "title", None) and bib_index.find_title(make_title_id(doc.title, year)):
+            sync.mark(eid_val)
+            continue
+        new_eids.append(eid_val)
+
+    with ThreadPoolExecutor(max_workers=SCOPUS_WORKERS) as pool:
+        abstracts = list(pool.map(retrieve_abstract, new_eids))
+
+    # Collect the new entries, those without Scopus BibTeX are completed
+    # together afterwards
+    candidates = []
+    seen = set()
+    for eid_val, ab in zip(new_eids, abstracts):
+        if ab is None:
+            continue
         try:
             meta = scopus_metadata(ab)
         except Exception:
@@ -154,12 +197,17 @@ def bib_get_entries_scopus(bibfile, author_id, years, outputfile):
         title_id = make_title_id(meta["title"], meta["year"])
 
         # DOI duplicate check
-        if meta["doi"] and any(meta["doi"].lower() == d for _, _, d in existing_ids):
+        if bib_index.find_doi(meta["doi"]):
+            sync.mark(eid_val)
             continue
 
         # Title/year duplicate check
-        if any(title_id == t for _, t, _ in existing_ids):
+        if bib_index.find_title(title_id):
+            sync.mark(eid_val)
+            continue
+        if title_id in seen:
             continue
+        seen.add(title_id)
 
         # Prefer native Scopus BibTeX for journal articles
         try:
@@ -174,27 +222,29 @@ def bib_get_entries_scopus(bibfile, author_id, years, outputfile):
         except Exception:
             bib = None
 
-        if not bib:
-            bib = build_bibtex(ab)
-            completer = BibtexAutocomplete()
-            completer.load_string(bib)
-            completer.autocomplete()
-            bib = completer.write_string()[0]
-            bib = str2latex(bib)
-        print(bib)
-
-        if not global_prefs.quiet:
-            yn = input("Add this entry? Y/N ").upper()
-            if yn != "Y":
-                continue
-
-        bib_db = bibtexparser.loads(bib, tbparser)
-
-    writer = BibTexWriter()
-    writer.order_entries_by = None
-
-    with open(outputfile, "w", encoding="utf-8") as f:
-        f.write(bibtexparser.dumps(bib_db, writer))
+        if bib:
+            candidates.append([eid_val, bib, False])
+        else:
+            candidates.append([eid_val, build_bibtex(ab), True])
+
+    # Try to fill the entries Scopus had no BibTeX for using BibTeX autocomplete
+    completed = autocomplete_entries([bib for [eid_val, bib, complete] in candidates if complete])
+    completed.reverse()
+    for candidate in candidates:
+        if candidate[2]:
+            candidate[1] = str2latex(completed.pop()[0])
+
+    # Then ask about all of them, every entry gets its EID (Scopus BibTeX has
+    # none) so later runs find it with find_eid
+    to_review = []
+    for [eid_val, bib, complete] in candidates:
+        def prepare(entry, eid_val=eid_val):
+            entry["eid"] = eid_val
+        to_review.append([bib, prepare])
+    done = review_entries(bib_db, bib_index, to_review)
+    for [eid_val, bib, complete], reviewed in zip(candidates, done):
+        if reviewed:
+            sync.mark(eid_val)
 
 
 # -------------------------------
@@ -209,4 +259,7 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--output", default="scopus.bib")
     args = parser.parse_args()
 
-    bib_get_entries_scopus(args.bibfile, args.scopus_id, args.years, args.output)
+    bib_db = load_bib(args.bibfile)
+    bib_get_entries_scopus(bib_db, args.scopus_id, args.years)
+    write_bib(bib_db, args.output)
+    save_sync_states()
@@ -17,7 +17,8 @@ from typing import Optional
 
 import requests
 
-from .bib_get_entries_orcid import make_title_id
+from .bib_identity_index import make_title_id
+from . import http_client
 
 SEARCH_URL = "https://api.uspto.gov/api/v1/patent/applications/search"
 APPLICATION_URL = "https://api.uspto.gov/api/v1/patent/applications/{app}"
@@ -58,11 +59,11 @@ def search_applications(
         payload["fields"] = fields
 
     try:
-        response = requests.post(
+        response = http_client.post(
             SEARCH_URL,
+            source="uspto",
             json=payload,
             headers=_headers(api_key),
-            timeout=30,
         )
         response.raise_for_status()
     except requests.HTTPError as http_err:
@@ -78,10 +79,10 @@ def search_applications(
 def get_application(application_number: str, api_key: str) -> dict:
 
     try:
-        response = requests.get(
+        response = http_client.get(
             APPLICATION_URL.format(app=application_number),
+            source="uspto",
             headers=_headers(api_key),
-            timeout=30,
         )
 
         response.raise_for_status()
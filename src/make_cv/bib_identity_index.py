@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Lookup tables used to decide whether a record from Google Scholar, ORCID,
+# Scopus or PubMed is already in the .bib file
+# Each identifier (title+year id, DOI, Google publication id, Scopus EID,
+# PubMed id) maps to the list of entries that carry it, so checking a remote
+# record is a dictionary lookup instead of a scan over every entry.
+
+import atexit
+import os
+import pickle
+import re
+from functools import lru_cache
+
+from pylatexenc.latex2text import LatexNodes2Text
+
+from .bib_io import entry_year
+from . import global_prefs
+
+# Converting LaTeX to text is by far the slowest part of building a title id.
+# Titles without any LaTeX markup skip the conversion, and converted titles are
+# remembered in memory and in ~/.cache/make_cv/title_keys.pickle
+latex_converter = LatexNodes2Text()
+latex_markup = re.compile(r"[\\{}$%]")
+title_key_file = 'title_keys.pickle'
+title_keys = None
+title_keys_changed = False
+
+def load_title_keys():
+	global title_keys
+	title_keys = {}
+	try:
+		with open(os.path.join(os.path.expanduser(global_prefs.cache_dir), title_key_file), 'rb') as f:
+			title_keys = pickle.load(f)
+	except Exception:
+		pass
+	atexit.register(save_title_keys)
+
+def save_title_keys():
+	if not title_keys_changed:
+		return
+	filename = os.path.join(os.path.expanduser(global_prefs.cache_dir), title_key_file)
+	try:
+		os.makedirs(os.path.dirname(filename), exist_ok=True)
+		with open(filename +'.tmp', 'wb') as f:
+			pickle.dump(title_keys, f, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(filename +'.tmp', filename)
+	except OSError:
+		pass
+
+@lru_cache(maxsize=65536)
+def title_key(title):
+	# lower case title text with everything but letters and numbers removed
+	if not latex_markup.search(title):
+		return re.sub(r"[^a-z0-9]+", "", title.lower())
+
+	global title_keys_changed
+	if title_keys is None:
+		load_title_keys()
+	key = title_keys.get(title)
+	if key is None:
+		# Strip braces and other BibTeX bracketing
+		title_string = latex_converter.latex_to_text(title).lower()
+		key = re.sub(r"[^a-z0-9]+", "", title_string)
+		title_keys[title] = key
+		title_keys_changed = True
+	return key
+
+def make_title_id(title, year):
+	title_id = title_key(title)
+	title_id += str(year)
+	return title_id
+
+class BibIdentityIndex:
+	def __init__(self, entries):
+		self.title_ids = {}
+		self.dois = {}
+		self.google_pub_ids = {}
+		self.eids = {}
+		self.pmids = {}
+		for entry in entries:
+			self.add(entry)
+
+	def add(self, entry):
+		# Register a new entry, or one whose identifiers have changed
+		title = entry.get('title') or entry.get('TITLE')
+		if title is not None:
+			self._insert(self.title_ids, make_title_id(title, entry_year(entry)), entry)
+		self._insert(self.dois, entry.get('doi') or entry.get('DOI'), entry)
+		self._insert(self.google_pub_ids, entry.get('google_pub_id'), entry)
+		self._insert(self.eids, entry.get('eid'), entry)
+		self._insert(self.pmids, entry.get('pmid'), entry)
+
+	def find_title(self, title_id):
+		return self._find(self.title_ids, title_id)
+
+	def find_doi(self, doi):
+		return self._find(self.dois, doi)
+
+	def find_google_pub_id(self, pub_id):
+		return self._find(self.google_pub_ids, pub_id)
+
+	def find_eid(self, eid):
+		return self._find(self.eids, eid)
+
+	def find_pmid(self, pmid):
+		return self._find(self.pmids, pmid)
+
+	@staticmethod
+	def _insert(table, key, entry):
+		if not key:
+			return
+		matches = table.setdefault(str(key).strip().lower(), [])
+		if not any(match is entry for match in matches):
+			matches.append(entry)
+
+	@staticmethod
+	def _find(table, key):
+		if not key:
+			return []
+		return table.get(str(key).strip().lower(), [])
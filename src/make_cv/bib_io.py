@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Routines for reading and writing the scholarship .bib file
+# The file is parsed once per run and the resulting database is handed to
+# every routine that needs it (tables, stats, collaborator lists, ...)
+# Parsed databases are cached on disk (see bib_cache.py) so an unchanged
+# .bib file is not parsed again on the next run, and only the entries that
+# changed are rewritten when the file is saved
+
+import os
+import re
+from bisect import bisect_right
+
+import bibtexparser
+from bibtexparser.bparser import BibTexParser
+from bibtexparser.bwriter import BibTexWriter
+
+from .bib_cache import bib_hash
+from .bib_cache import read_bib_cache
+from .bib_cache import write_bib_cache
+from . import global_prefs
+
+def entry_year(paperbibentry):
+	# same as getyear but malformed years sort as year 0 instead of stopping the run
+	try:
+		if "year" in paperbibentry.keys():
+			return(int(paperbibentry["year"]))
+		if "date" in paperbibentry.keys():
+			return(int(paperbibentry["date"][:4]))
+	except ValueError:
+		pass
+	return(0)
+
+def make_keyword_index(entries,categories):
+	# For each category, the entries whose keywords contain it, newest first.
+	# 'ID' are the citation keys, 'rank' the position in the newest-first order
+	# of the whole database (used to merge categories) and 'minus_year' the
+	# negated years so the entries in a year window are found with a bisection
+	years = [entry_year(entry) for entry in entries]
+	order = sorted(range(len(entries)), key=lambda k: years[k], reverse=True)
+
+	index = {}
+	for category in categories:
+		index[category.strip().lower()] = {'ID': [], 'rank': [], 'minus_year': []}
+
+	for rank,k in enumerate(order):
+		if not "keywords" in entries[k].keys():
+			continue
+		kword = str(entries[k]["keywords"]).lower()
+		for category,cat_index in index.items():
+			if kword.find(category) > -1:
+				cat_index['ID'].append(entries[k]["ID"])
+				cat_index['rank'].append(rank)
+				cat_index['minus_year'].append(-years[k])
+	return(index)
+
+def keyword_window(cat_index,begin_year):
+	# number of entries in the category published in or after begin_year
+	return(bisect_right(cat_index['minus_year'],-begin_year))
+
+# Fields computed from the entries that are stored in the cache with them
+derived_fields = {'keyword_index': lambda entries: make_keyword_index(entries,global_prefs.pub_categories)}
+
+def make_derived(entries):
+	return {name: build(entries) for name, build in derived_fields.items()}
+
+def get_derived(bib_database,name):
+	derived = getattr(bib_database,'derived',None)
+	if derived is None:
+		derived = {}
+		bib_database.derived = derived
+	if not name in derived:
+		derived[name] = derived_fields[name](bib_database.entries)
+	return(derived[name])
+
+def get_keyword_index(bib_database,categories):
+	index = get_derived(bib_database,'keyword_index')
+	missing = [category for category in categories if not category.strip().lower() in index]
+	if missing:
+		index.update(make_keyword_index(bib_database.entries,missing))
+	return(index)
+
+# Incremental writing
+# write_bib keeps the text of the file that was loaded and the location of
+# every @entry{...} in it.  Entries whose fields did not change are copied
+# from the original text, changed entries are re-emitted in place, removed
+# ones are cut out and new ones are appended.  Untouched entries keep their
+# formatting so diffs of the data folder only show real changes.
+
+bib_block = re.compile(r'@\s*([A-Za-z]+)\s*\{')
+brace = re.compile(r'[{}]')
+
+def split_bib_text(bibtex_str):
+	# Returns a list of [kind, start, end, name] for each @...{...} block where
+	# kind is 'entry', 'comment', 'string' or 'preamble' and name is the citation
+	# key of an entry or the text of a comment.  None if the braces do not balance.
+	blocks = []
+	pos = 0
+	while True:
+		match = bib_block.search(bibtex_str,pos)
+		if match is None:
+			return(blocks)
+		depth = 1
+		end = match.end()
+		while depth > 0:
+			next_brace = brace.search(bibtex_str,end)
+			if next_brace is None:
+				return(None)
+			depth += 1 if next_brace.group(0) == '{' else -1
+			end = next_brace.end()
+
+		kind = match.group(1).lower()
+		body = bibtex_str[match.end():end-1]
+		if kind == 'comment':
+			name = body
+		elif kind in ['string','preamble']:
+			name = None
+		else:
+			kind = 'entry'
+			name = body.split(',',1)[0].strip()
+		blocks.append([kind,match.start(),end,name])
+		pos = end
+
+crossref_field = re.compile(r'(?:^|[,\s])(?:crossref|xref|xdata)\s*=\s*[{"]?([^,}"]+)',re.IGNORECASE)
+
+def subset_bib_text(bibtex_str,keys):
+	# The @string, @preamble and @comment blocks of a .bib file with only the
+	# entries whose keys are given (and the entries those crossref), None if
+	# the braces do not balance
+	blocks = split_bib_text(bibtex_str)
+	if blocks is None:
+		return(None)
+	entries = {}
+	for kind,start,end,name in blocks:
+		if kind == 'entry':
+			entries[name.lower()] = bibtex_str[start:end]
+	wanted = set()
+	new_keys = [key.strip().lower() for key in keys]
+	while new_keys:
+		key = new_keys.pop()
+		if key in wanted or not key in entries:
+			continue
+		wanted.add(key)
+		for match in crossref_field.finditer(entries[key]):
+			new_keys += [parent.strip().lower() for parent in match.group(1).split(',')]
+
+	pieces = []
+	for kind,start,end,name in blocks:
+		if kind != 'entry' or name.lower() in wanted:
+			pieces.append(bibtex_str[start:end])
+	return('\n\n'.join(pieces) +'\n')
+
+def write_cited_bib(bibfile,keys,outputfile):
+	# Writes the entries of bibfile with the given keys to outputfile so biber
+	# and pandoc only read what is cited.  Returns False if the whole file is
+	# needed (\nocite{*}) or could not be split.
+	if '*' in keys:
+		return(False)
+	with open(bibfile,encoding='utf-8') as bibtex_file:
+		bibtex_str = subset_bib_text(bibtex_file.read(),keys)
+	if bibtex_str is None:
+		return(False)
+	try:
+		with open(outputfile,encoding='utf-8') as cited_file:
+			if cited_file.read() == bibtex_str:
+				return(True)
+	except OSError:
+		pass
+	os.makedirs(os.path.dirname(outputfile) or '.',exist_ok=True)
+	with open(outputfile,'w',encoding='utf-8') as cited_file:
+		cited_file.write(bibtex_str)
+	return(True)
+
+def attach_source(bib_database,bibtex_str):
+	# remember the text the database was read from so write_bib can splice into it
+	bib_database.source = None
+	blocks = split_bib_text(bibtex_str)
+	if blocks is None:
+		return
+	if [name for kind,start,end,name in blocks if kind == 'entry'] != [entry['ID'] for entry in bib_database.entries]:
+		return
+	bib_database.source = {'text': bibtex_str,
+							'blocks': blocks,
+							'entries': list(bib_database.entries),
+							'fields': [dict(entry) for entry in bib_database.entries],
+							'comments': list(bib_database.comments),
+							'strings': dict(bib_database.strings),
+							'preambles': list(bib_database.preambles)}
+
+def splice_bib(bib_database):
+	# returns the new text of the .bib file or None if it has to be written from scratch
+	source = getattr(bib_database,'source',None)
+	if source is None:
+		return(None)
+	if dict(bib_database.strings) != source['strings'] or bib_database.preambles != source['preambles']:
+		return(None)
+
+	removed_comments = list(source['comments'])
+	added_comments = []
+	for comment in bib_database.comments:
+		if comment in removed_comments:
+			removed_comments.remove(comment)
+		else:
+			added_comments.append(comment)
+
+	writer = BibTexWriter()
+	current = set(id(entry) for entry in bib_database.entries)
+	text = source['text']
+	pieces = []
+	comments_at = None
+	pos = 0
+	nentry = 0
+	for kind,start,end,name in source['blocks']:
+		pieces.append(text[pos:start])
+		pos = end
+		removed = False
+		if kind == 'entry':
+			entry = source['entries'][nentry]
+			nentry += 1
+			if not id(entry) in current:
+				removed = True
+			elif entry != source['fields'][nentry-1]:
+				pieces.append(writer._entry_to_bibtex(entry).rstrip('\n'))
+			else:
+				pieces.append(text[start:end])
+		elif kind == 'comment' and name in removed_comments:
+			# new comments (e.g. updated Google_stats) go where the first removed one was
+			removed_comments.remove(name)
+			if comments_at is None:
+				comments_at = len(pieces)
+			removed = True
+		else:
+			pieces.append(text[start:end])
+
+		if removed:
+			# remove the blank lines that followed the block as well
+			while pos < len(text) and text[pos].isspace():
+				pos += 1
+	pieces.append(text[pos:])
+
+	# a comment that was not in an @comment block can not be located
+	if removed_comments:
+		return(None)
+	if added_comments:
+		if comments_at is None:
+			comments_at = 0
+		pieces.insert(comments_at,''.join('@comment{' +comment +'}\n\n' for comment in added_comments))
+
+	bibtex_str = ''.join(pieces)
+	# bibtexparser reads any text after an @comment block up to the next @ as
+	# part of the comment, so a comment must not end up in front of free text
+	blocks = split_bib_text(bibtex_str)
+	if blocks is None:
+		return(None)
+	for kind,start,end,name in blocks:
+		following = bibtex_str[end:].lstrip()
+		if kind == 'comment' and following and not following.startswith('@'):
+			return(None)
+
+	loaded = set(id(entry) for entry in source['entries'])
+	new_entries = [writer._entry_to_bibtex(entry) for entry in bib_database.entries if not id(entry) in loaded]
+	if new_entries:
+		if bibtex_str.strip():
+			bibtex_str = bibtex_str.rstrip('\n') +'\n\n'
+		bibtex_str += writer.entry_separator.join(new_entries)
+	return(bibtex_str)
+
+def add_bib_entries(bib_database,bibtex_str):
+	# parse the entries in a string, append them to the database and return them
+	new_database = bibtexparser.loads(bibtex_str, bib_parser())
+	bib_database.entries.extend(new_database.entries)
+	return(new_database.entries)
+
+def bib_parser():
+	# homogenize_fields: Sanitize BibTeX field names, for example change `url` to `link` etc.
+	tbparser = BibTexParser(common_strings=True)
+	tbparser.homogenize_fields = False  # no dice
+	tbparser.alt_dict['url'] = 'url'    # this finally prevents change 'url' to 'link'
+	return(tbparser)
+
+def load_bib(bibfile):
+	with open(bibfile,encoding='utf-8') as bibtex_file:
+		bibtex_str = bibtex_file.read()
+	content_hash = bib_hash(bibtex_str)
+
+	cached = read_bib_cache(bibfile,content_hash)
+	if cached is not None:
+		[bib_database,bib_database.derived] = cached
+	else:
+		bib_database = bibtexparser.loads(bibtex_str, bib_parser())
+		bib_database.derived = make_derived(bib_database.entries)
+		write_bib_cache(bibfile,content_hash,bib_database,bib_database.derived)
+
+	attach_source(bib_database,bibtex_str)
+	return(bib_database)
+
+def write_bib(bib_database,outputfile):
+	bibtex_str = splice_bib(bib_database)
+	if bibtex_str is None:
+		writer = BibTexWriter()
+		writer.order_entries_by = None
+		bibtex_str = bibtexparser.dumps(bib_database,writer)
+	with open(outputfile, 'w', encoding='utf-8') as thebibfile:
+		thebibfile.write(bibtex_str)
+	attach_source(bib_database,bibtex_str)
+
+	# the next stage that reads this file can then skip parsing it
+	bib_database.derived = make_derived(bib_database.entries)
+	write_bib_cache(outputfile,bib_hash(bibtex_str),bib_database,bib_database.derived)
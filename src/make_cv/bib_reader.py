@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Fast reader for .bib files
+# bibtexparser 1.x parses with pyparsing, which is slow on large files and
+# always builds the whole database.  iter_bib_entries scans the text directly
+# and yields the entries one at a time as the same dictionaries bibtexparser
+# produces with the settings in bib_io.bib_parser.  Entries can be filtered by
+# year, keyword category and whether they have authors before they are
+# returned, and a caller can stop reading as soon as it has what it needs.
+# It handles the BibTeX written by make_cv, BibDesk and JabRef.  Run
+#   python -m make_cv.bib_reader --check scholarship.bib
+# to compare it with bibtexparser on a file.
+
+import argparse
+import re
+import sys
+import time
+
+import bibtexparser
+from bibtexparser.bibdatabase import COMMON_STRINGS
+from bibtexparser.bibdatabase import STANDARD_TYPES
+
+from .bib_io import bib_parser
+from .bib_io import entry_year
+
+# Like bibtexparser, a block has to start a line unless it directly follows
+# the previous block; any other text is a comment that runs to the next line
+# starting with @
+block_start = re.compile(r'^[ \t\r\f\v]*@[ \t]*([A-Za-z]+)[ \t]*\{', re.M)
+block_here = re.compile(r'\s*@[ \t]*([A-Za-z]+)[ \t]*\{')
+comment_end = re.compile(r'\n\s*@')
+brace = re.compile(r'[{}]')
+quote_or_brace = re.compile(r'["{}]')
+field_name = re.compile(r'\s*([A-Za-z0-9_\-().+]+)\s*=\s*')
+string_name = re.compile(r'[A-Za-z0-9_\-:]+')
+integer = re.compile(r'[0-9]+')
+separator = re.compile(r'\s*(#|,|\Z)')
+
+def closing_brace(bibtex_str,pos):
+	# position just after the brace closing the one that was opened before pos
+	depth = 1
+	while depth > 0:
+		next_brace = brace.search(bibtex_str,pos)
+		if next_brace is None:
+			raise ValueError('Unbalanced braces in .bib file at line ' +str(bibtex_str.count('\n',0,pos)+1))
+		depth += 1 if next_brace.group(0) == '{' else -1
+		pos = next_brace.end()
+	return(pos)
+
+def closing_quote(bibtex_str,pos):
+	# position just after the " closing a quoted value, braces may contain "
+	depth = 0
+	while True:
+		next_char = quote_or_brace.search(bibtex_str,pos)
+		if next_char is None:
+			raise ValueError('Unterminated quote in .bib file at line ' +str(bibtex_str.count('\n',0,pos)+1))
+		pos = next_char.end()
+		if next_char.group(0) == '{':
+			depth += 1
+		elif next_char.group(0) == '}':
+			depth -= 1
+		elif depth == 0:
+			return(pos)
+
+def strip_after_new_lines(text):
+	# bibtexparser removes the indentation of continuation lines
+	if not '\n' in text:
+		return(text)
+	lines = text.splitlines()
+	return('\n'.join([lines[0]] +[line.lstrip() for line in lines[1:]]))
+
+def read_value(bibtex_str,pos,strings):
+	# returns the value starting at pos and the position after it
+	parts = []
+	literal = True
+	while True:
+		match = integer.match(bibtex_str,pos)
+		if match and not string_name.match(bibtex_str,match.end()):
+			parts.append(match.group(0))
+			end = match.end()
+		elif bibtex_str.startswith('{',pos):
+			end = closing_brace(bibtex_str,pos+1)
+			parts.append(strip_after_new_lines(bibtex_str[pos+1:end-1]))
+		elif bibtex_str.startswith('"',pos):
+			end = closing_quote(bibtex_str,pos+1)
+			parts.append(strip_after_new_lines(bibtex_str[pos+1:end-1]))
+		else:
+			match = string_name.match(bibtex_str,pos)
+			if match is None:
+				raise ValueError('Could not read value in .bib file at line ' +str(bibtex_str.count('\n',0,pos)+1))
+			name = match.group(0).lower()
+			if not name in strings:
+				raise ValueError('Undefined string ' +name +' in .bib file at line ' +str(bibtex_str.count('\n',0,pos)+1))
+			parts.append(strings[name])
+			literal = False
+			end = match.end()
+
+		match = separator.match(bibtex_str,end)
+		if match is None or match.group(1) != '#':
+			break
+		pos = match.end()
+		while bibtex_str[pos].isspace():
+			pos += 1
+
+	value = ''.join(parts)
+	if literal and value == '{}':
+		value = ''
+	return(value,end)
+
+def read_fields(bibtex_str,pos,end,strings):
+	# fields of an entry between pos and the closing brace at end
+	fields = {}
+	while True:
+		match = field_name.match(bibtex_str,pos,end)
+		if match is None:
+			break
+		[value,pos] = read_value(bibtex_str,match.end(),strings)
+		name = match.group(1).lower()
+		# bibtexparser keeps the first of repeated fields
+		if not name in fields:
+			fields[name] = value
+		while pos < end and bibtex_str[pos].isspace():
+			pos += 1
+		if pos >= end or bibtex_str[pos] != ',':
+			break
+		pos += 1
+	if bibtex_str[pos:end].strip():
+		raise ValueError('Could not read entry in .bib file at line ' +str(bibtex_str.count('\n',0,pos)+1))
+	return(fields)
+
+def entry_filter(begin_year=0,keywords=None,has_author=False):
+	# returns a function that tells whether an entry passes the filters
+	# keywords is a list of categories, an entry matches if its keywords
+	# contain any of them (the same test bib2latex_far uses)
+	if keywords is not None:
+		keywords = [keyword.strip().lower() for keyword in keywords]
+
+	def accept(entry):
+		if has_author and not "author" in entry.keys():
+			return(False)
+		if keywords is not None:
+			kword = str(entry.get("keywords","")).lower()
+			if not any(kword.find(keyword) > -1 for keyword in keywords):
+				return(False)
+		if begin_year > 0 and entry_year(entry) < begin_year:
+			return(False)
+		return(True)
+	return(accept)
+
+def iter_bib_entries(bibtex_str,begin_year=0,keywords=None,has_author=False):
+	# yields the entries of a .bib file that pass the filters, in file order
+	accept = entry_filter(begin_year,keywords,has_author)
+	strings = dict(COMMON_STRINGS)
+	if bibtex_str.startswith('\ufeff'):
+		bibtex_str = bibtex_str[1:]
+
+	pos = 0
+	while True:
+		match = block_here.match(bibtex_str,pos)
+		if match is None:
+			match = block_start.search(bibtex_str,pos)
+			if match is None:
+				return
+
+		kind = match.group(1).lower()
+		if kind == 'comment':
+			end = comment_end.search(bibtex_str,match.end())
+			pos = len(bibtex_str) if end is None else end.start()+1
+			continue
+
+		try:
+			end = closing_brace(bibtex_str,match.end())
+			pos = end
+			if kind == 'preamble':
+				continue
+			if kind == 'string':
+				fields = read_fields(bibtex_str,match.end(),end-1,strings)
+				strings.update(fields)
+				continue
+			if not kind in STANDARD_TYPES:
+				continue
+
+			comma = bibtex_str.find(',',match.end(),end)
+			if comma < 0:
+				continue
+			entry = read_fields(bibtex_str,comma+1,end-1,strings)
+		except ValueError as err:
+			# like bibtexparser, skip to the next line starting with @
+			print('Skipping .bib entry: ' +str(err))
+			next_block = block_start.search(bibtex_str,match.end())
+			pos = len(bibtex_str) if next_block is None else next_block.start()
+			continue
+		if not accept(entry):
+			continue
+		entry['ENTRYTYPE'] = kind
+		entry['ID'] = bibtex_str[match.end():comma].strip()
+		yield entry
+
+def read_bib_entries(bibfile,begin_year=0,keywords=None,has_author=False):
+	with open(bibfile,encoding='utf-8') as bibtex_file:
+		bibtex_str = bibtex_file.read()
+	yield from iter_bib_entries(bibtex_str,begin_year,keywords,has_author)
+
+def check_bib_reader(bibfile):
+	# compare the entries read by iter_bib_entries with those from bibtexparser
+	with open(bibfile,encoding='utf-8') as bibtex_file:
+		bibtex_str = bibtex_file.read()
+
+	start = time.perf_counter()
+	expected = bibtexparser.loads(bibtex_str,bib_parser()).entries
+	parser_time = time.perf_counter() -start
+
+	start = time.perf_counter()
+	try:
+		entries = list(iter_bib_entries(bibtex_str))
+	except ValueError as err:
+		print(bibfile +': ' +str(err))
+		return(False)
+	reader_time = time.perf_counter() -start
+
+	ok = len(entries) == len(expected)
+	if not ok:
+		print(bibfile +': ' +str(len(entries)) +' entries read, bibtexparser found ' +str(len(expected)))
+	for entry,expected_entry in zip(entries,expected):
+		if entry != expected_entry:
+			ok = False
+			print(bibfile +': entry ' +expected_entry['ID'] +' differs')
+			for key in sorted(set(entry.keys()) | set(expected_entry.keys())):
+				if entry.get(key) != expected_entry.get(key):
+					print('  ' +key +': ' +repr(entry.get(key)) +' != ' +repr(expected_entry.get(key)))
+			break
+
+	print(f'{bibfile}: {len(expected)} entries, bibtexparser {parser_time:.3f} s, bib_reader {reader_time:.3f} s, ' +('same entries' if ok else 'DIFFERENT'))
+	return(ok)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='This script reads entries from .bib files or checks the reader against bibtexparser')
+	parser.add_argument('bibfiles',nargs='+',help='the .bib files to read')
+	parser.add_argument('-c', '--check',action='store_true',help='compare the entries with those read by bibtexparser')
+	parser.add_argument('-y', '--begin_year',default=0,type=int,help='only entries from this year on')
+	parser.add_argument('-k', '--keyword',action='append',help='only entries with this keyword category, can be repeated')
+	parser.add_argument('-a', '--has_author',action='store_true',help='only entries that have authors')
+	args = parser.parse_args()
+
+	if args.check:
+		ok = all([check_bib_reader(bibfile) for bibfile in args.bibfiles])
+		sys.exit(0 if ok else 1)
+
+	for bibfile in args.bibfiles:
+		for entry in read_bib_entries(bibfile,args.begin_year,args.keyword,args.has_author):
+			print(entry['ID'] +' ' +entry.get('year',''))
@@ -2,6 +2,9 @@ quiet = False
 scrapeGoogle = False
 usePandoc = False
 odp_api_key = None
+cache_dir = '~/.cache/make_cv'
+offline = False
+record = False
 pub_categories = ['journal','refereed','conference', 'book', 'patent', 'invited','arXiv','techreport','user1','user2']
 other_sections = ['PersonalAwards','StudentAwards','Service','Reviews','GradAdvisees','UndergradResearch','Teaching','Grants','Proposals','References'] 
 files = {'ScholarshipFile': 'Scholarship/scholarship.bib',
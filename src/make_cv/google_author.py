@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Google Scholar author profile shared by bib_get_entries_google,
+# bib_add_citations and the Google_stats comment
+# Filling the profile with scholarly is slow and the call Google blocks most
+# often, so it is done once and the result (indices, cites_per_year and the
+# publication list with citation counts) is kept in
+# ~/.cache/make_cv/google_author_<id>.json.  The snapshot is used until it is
+# older than the time to live of the google source in http_client (1 day
+# unless googleCacheDays is set in make_cv.cfg).
+
+import json
+import os
+import time
+from enum import Enum
+
+from scholarly import scholarly
+from scholarly import ProxyGenerator
+from scholarly.data_types import PublicationSource
+
+from . import global_prefs
+from . import http_client
+
+# the profile filled during this run
+profiles = {}
+
+def snapshot_file(author_id):
+	return(os.path.join(os.path.expanduser(global_prefs.cache_dir), 'google_author_' +author_id +'.json'))
+
+def json_safe(value):
+	# scholarly objects are dictionaries, except for a few enums
+	if isinstance(value, dict):
+		return({str(key): json_safe(item) for key,item in value.items()})
+	if isinstance(value, (list, tuple)):
+		return([json_safe(item) for item in value])
+	if isinstance(value, Enum):
+		return(value.value)
+	if value is None or isinstance(value, (str, int, float, bool)):
+		return(value)
+	return(str(value))
+
+def read_snapshot(author_id):
+	# returns (author, age in seconds) or (None, None)
+	try:
+		with open(snapshot_file(author_id), 'r', encoding='utf-8') as f:
+			snapshot = json.load(f)
+	except (OSError, ValueError):
+		return(None, None)
+	author = snapshot['author']
+	# so scholarly.fill can still complete a publication
+	for pub in author.get('publications', []):
+		if 'source' in pub:
+			pub['source'] = PublicationSource(pub['source'])
+	return(author, time.time() -snapshot['fetched'])
+
+def write_snapshot(author_id, author):
+	filename = snapshot_file(author_id)
+	os.makedirs(os.path.dirname(filename), exist_ok=True)
+	with open(filename +'.tmp', 'w', encoding='utf-8') as f:
+		json.dump({'fetched': time.time(), 'author': json_safe(author)}, f)
+	os.replace(filename +'.tmp', filename)
+
+def google_author(author_id, scraper_id=None):
+	# returns the filled author profile, None if it could not be retrieved
+	if author_id in profiles:
+		return(profiles[author_id])
+
+	[author, age] = read_snapshot(author_id)
+	if author is not None and (age < http_client.sources['google']['ttl'] or global_prefs.offline):
+		profiles[author_id] = author
+		return(author)
+	if global_prefs.offline:
+		print('Offline and no saved Google Scholar profile for ' +author_id)
+		return(None)
+
+	# Set up a ProxyGenerator object to use free proxies
+	# This needs to be done only once per session
+	# Helps avoid Google Scholar locking out
+	if scraper_id:
+		pg = ProxyGenerator()
+		success = pg.ScraperAPI(scraper_id)
+		if success:
+			print('ScraperAPI in use')
+			scholarly.use_proxy(pg)
+
+	try:
+		author = scholarly.search_author_id(author_id)
+		author = scholarly.fill(author, sections=['indices', 'publications'])
+	except Exception as exc:
+		print('Error retrieving author from Google Scholar: ' +str(author_id) +' ' +str(exc))
+		return(None)
+
+	try:
+		write_snapshot(author_id, author)
+	except OSError as exc:
+		print('Could not save the Google Scholar profile: ' +str(exc))
+	profiles[author_id] = author
+	return(author)
+
+def add_google_stats(bib_database, author):
+	# keep the author indices as a comment in the .bib file for Google_stats2latex
+	author_stats =	{'i10index': author.get('i10index'),
+					'hindex': author.get('hindex'),
+					'citedby': author.get('citedby'),
+					'hindex5y': author.get('hindex5y'),
+					'i10index5y': author.get('i10index5y'),
+					'citedby5y': author.get('citedby5y')}
+	bib_database.comments = [c for c in bib_database.comments if not c.startswith('Google_stats')]
+	bib_database.comments.append('Google_stats: ' + json.dumps(author_stats))
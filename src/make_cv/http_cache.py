@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# On-disk cache of web responses used by http_client
+# Successful GET responses (and POSTed JSON queries) are kept in
+# ~/.cache/make_cv/http.sqlite keyed by the full URL (with its query), the
+# Accept header and any JSON body.  A response younger than the time to live
+# of its source is used without asking the server; an older one is
+# revalidated with If-None-Match/If-Modified-Since so an unchanged response
+# does not have to be downloaded again.
+# With --offline only the cache is used and with --record every response is
+# fetched again and stored whatever its time to live, so a later --offline
+# run repeats it exactly.
+# Query parameters that carry keys (the ScraperAPI api_key) are left out of
+# the cache key and the stored URL so no secret is written to disk.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import global_prefs
+
+cache_file = 'http.sqlite'
+secret_params = ['api_key', 'apikey', 'access_token']
+
+lock = threading.Lock()
+connection = None
+connection_path = None
+
+def connect():
+	# one connection shared by all threads, opened when first needed
+	global connection, connection_path
+	path = os.path.join(os.path.expanduser(global_prefs.cache_dir), cache_file)
+	if connection is None or connection_path != path:
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		connection = sqlite3.connect(path, check_same_thread=False)
+		connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, '
+							'status INTEGER, headers TEXT, content BLOB, stored REAL)')
+		connection.commit()
+		connection_path = path
+	return(connection)
+
+def public_url(url):
+	# the URL with its query sorted, so params in any order give the same
+	# key, and without the secret params
+	parts = urlsplit(url)
+	query = [(name, value) for (name, value) in parse_qsl(parts.query, keep_blank_values=True) if not name.lower() in secret_params]
+	return(urlunsplit(parts._replace(query=urlencode(sorted(query)))))
+
+def cache_key(method, url, kwargs):
+	# the URL requests would send
+	prepared = requests.Request(method, url, params=kwargs.get('params')).prepare().url
+	headers = CaseInsensitiveDict(kwargs.get('headers') or {})
+	key = method +' ' +public_url(prepared) +' ' +headers.get('Accept', '')
+	if 'json' in kwargs:
+		key += ' ' +json.dumps(kwargs['json'], sort_keys=True)
+	return(key)
+
+def lookup(key):
+	# returns (response, age in seconds) or (None, None)
+	with lock:
+		try:
+			row = connect().execute('SELECT url, status, headers, content, stored FROM responses WHERE key = ?', (key,)).fetchone()
+		except sqlite3.Error as exc:
+			print('Could not read the web cache: ' +str(exc))
+			return(None, None)
+	if row is None:
+		return(None, None)
+	[url, status, headers, content, stored] = row
+	response = requests.Response()
+	response.url = url
+	response.status_code = status
+	response.headers = CaseInsensitiveDict(json.loads(headers))
+	response._content = content
+	response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+	return(response, time.time() -stored)
+
+def store(key, response):
+	with lock:
+		try:
+			db = connect()
+			db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+						(key, public_url(response.url), response.status_code, json.dumps(dict(response.headers)), response.content, time.time()))
+			db.commit()
+		except sqlite3.Error as exc:
+			print('Could not write to the web cache: ' +str(exc))
+
+def touch(key):
+	# the server said the cached response is still current
+	with lock:
+		try:
+			db = connect()
+			db.execute('UPDATE responses SET stored = ? WHERE key = ?', (time.time(), key))
+			db.commit()
+		except sqlite3.Error as exc:
+			print('Could not write to the web cache: ' +str(exc))
+
+def validators(response):
+	# headers for asking the server whether the cached response changed
+	headers = {}
+	if 'ETag' in response.headers:
+		headers['If-None-Match'] = response.headers['ETag']
+	if 'Last-Modified' in response.headers:
+		headers['If-Modified-Since'] = response.headers['Last-Modified']
+	return(headers)
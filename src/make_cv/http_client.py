@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# HTTP requests for all of the web sources make_cv uses
+# Each host gets one requests.Session so connections (and their TLS
+# handshakes) are reused.  Every source has its own timeout, a limit on how
+# many requests can be in flight at once and optionally on how many are made
+# per second.  Requests that fail with 429 or a 5xx status or that cannot
+# connect are retried with exponential backoff, waiting as long as the
+# Retry-After header asks when the server sends one.
+# GET responses are cached on disk for the time to live of their source (see
+# http_cache.py), --offline answers only from that cache.  Requests made with
+# cache=False (answers that cannot be reused) are only stored with --record.
+# Use http_client.get(url, source='orcid', ...) in place of requests.get.
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import global_prefs
+from . import http_cache
+
+# timeout in seconds, number of requests at once, requests per second (0 is
+# no limit) and how long responses are cached in seconds (0 is not cached)
+day = 24*60*60
+sources = {'orcid': {'timeout': 10, 'max_concurrent': 4, 'max_rate': 12, 'ttl': day},
+			'pubmed': {'timeout': 30, 'max_concurrent': 3, 'max_rate': 3, 'ttl': 7*day},
+			'uspto': {'timeout': 30, 'max_concurrent': 2, 'max_rate': 0, 'ttl': 30*day},
+			'google': {'timeout': 20, 'max_concurrent': 1, 'max_rate': 1, 'ttl': day},
+			'scraperapi': {'timeout': 70, 'max_concurrent': 2, 'max_rate': 0, 'ttl': day}}
+default_source = {'timeout': 30, 'max_concurrent': 4, 'max_rate': 0, 'ttl': 0}
+
+max_retries = 4
+backoff = 1.0
+max_backoff = 60.0
+retry_statuses = {429, 500, 502, 503, 504}
+
+lock = threading.Lock()
+sessions = {}
+limits = {}
+
+class SourceLimit:
+	# bounds the requests in flight and spaces them out for one source
+	def __init__(self, max_concurrent, max_rate):
+		self.semaphore = threading.BoundedSemaphore(max_concurrent)
+		self.interval = 1.0/max_rate if max_rate > 0 else 0.0
+		self.next_time = 0.0
+		self.lock = threading.Lock()
+
+	def wait(self):
+		if self.interval == 0.0:
+			return
+		with self.lock:
+			now = time.monotonic()
+			delay = self.next_time -now
+			self.next_time = max(now, self.next_time) +self.interval
+		if delay > 0:
+			time.sleep(delay)
+
+def source_settings(source):
+	return(sources.get(source, default_source))
+
+def session(url):
+	host = urlsplit(url).netloc
+	with lock:
+		if not host in sessions:
+			s = requests.Session()
+			adapter = HTTPAdapter(pool_connections=1, pool_maxsize=8)
+			s.mount('https://', adapter)
+			s.mount('http://', adapter)
+			sessions[host] = s
+		return(sessions[host])
+
+def source_limit(source):
+	with lock:
+		if not source in limits:
+			settings = source_settings(source)
+			limits[source] = SourceLimit(settings['max_concurrent'], settings['max_rate'])
+		return(limits[source])
+
+def retry_after(response):
+	# seconds asked for by the Retry-After header, None if there is none
+	value = response.headers.get('Retry-After')
+	if value is None:
+		return(None)
+	try:
+		return(max(0.0, float(value)))
+	except ValueError:
+		pass
+	try:
+		return(max(0.0, (parsedate_to_datetime(value) -datetime.now(timezone.utc)).total_seconds()))
+	except (TypeError, ValueError):
+		return(None)
+
+def backoff_delay(attempt):
+	return(min(max_backoff, backoff*2**attempt)*random.uniform(0.5, 1.0))
+
+def request(method, url, source=None, refresh=False, cache=True, **kwargs):
+	# returns the response, the caller checks the status as with requests
+	# refresh asks the server even if the cached response is still fresh
+	if source is None:
+		source = urlsplit(url).netloc
+	if not cache and not (global_prefs.offline or global_prefs.record):
+		return(send(method, url, source, **kwargs))
+	# only GETs and JSON queries (USPTO searches) are cached
+	if method != 'GET' and not 'json' in kwargs:
+		if global_prefs.offline:
+			raise requests.ConnectionError('Offline, not sending ' +method +' ' +url)
+		return(send(method, url, source, **kwargs))
+
+	ttl = source_settings(source)['ttl']
+	key = http_cache.cache_key(method, url, kwargs)
+	[cached, age] = http_cache.lookup(key)
+	if global_prefs.offline:
+		if cached is None:
+			raise requests.ConnectionError('Offline and no cached response for ' +url)
+		return(cached)
+	if cached is not None and not (global_prefs.record or refresh):
+		if age < ttl:
+			return(cached)
+		# ask the server whether the cached response is still good
+		kwargs['headers'] = dict(kwargs.get('headers') or {}, **http_cache.validators(cached))
+
+	response = send(method, url, source, **kwargs)
+	if response.status_code == 304 and cached is not None:
+		http_cache.touch(key)
+		return(cached)
+	if response.status_code == 200 and (ttl > 0 or global_prefs.record):
+		http_cache.store(key, response)
+	return(response)
+
+def send(method, url, source, **kwargs):
+	if not 'timeout' in kwargs:
+		kwargs['timeout'] = source_settings(source)['timeout']
+	limit = source_limit(source)
+
+	for attempt in range(max_retries +1):
+		limit.wait()
+		response = None
+		with limit.semaphore:
+			try:
+				response = session(url).request(method, url, **kwargs)
+			except (requests.ConnectionError, requests.Timeout):
+				if attempt == max_retries:
+					raise
+
+		if response is not None:
+			if not response.status_code in retry_statuses or attempt == max_retries:
+				return(response)
+			delay = retry_after(response)
+			if delay is None:
+				delay = backoff_delay(attempt)
+		else:
+			delay = backoff_delay(attempt)
+		time.sleep(min(delay, max_backoff))
+
+def get(url, source=None, refresh=False, cache=True, **kwargs):
+	return(request('GET', url, source, refresh, cache, **kwargs))
+
+def post(url, source=None, refresh=False, cache=True, **kwargs):
+	return(request('POST', url, source, refresh, cache, **kwargs))
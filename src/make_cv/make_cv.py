@@ -4,6 +4,7 @@
 # script folder must be in path
 
 import os
+import io
 import sys
 import subprocess
 import glob
@@ -17,6 +18,9 @@ from pathlib import Path
 import datetime
 import warnings
 import re
+import time
+import hashlib
+import json
 import pybliometrics
 from git import Repo
 from importlib import metadata
@@ -37,6 +41,12 @@ from .grants2latex_far import grants2latex_far
 from .props2latex_far import props2latex_far
 from .UR2latex import UR2latex
 from .bib2latex_far import bib2latex_far
+from .bib_io import load_bib
+from .bib_io import write_bib
+from .bib_io import get_keyword_index
+from .bib_io import write_cited_bib
+from .sync_state import save_sync_states
+from .bib_identity_index import BibIdentityIndex
 from .thesis2latex_far import thesis2latex_far
 from .personal_awards2latex import personal_awards2latex
 from .student_awards2latex import student_awards2latex
@@ -44,11 +54,23 @@ from .service2latex import service2latex
 from .reviews2latex_far import reviews2latex_far
 from .teaching2latex_far import teaching2latex_far
 from .teaching2latex_short import teaching2latex_short
-from .copy_with_timestamp import copy_with_timestamp
+from .backup_store import snapshot
+from .table_manifest import TableManifest
+from .table_manifest import file_hash
+from .table_manifest import manifest_file
 from . import global_prefs
+from . import http_client
 	
 sections = global_prefs.pub_categories +global_prefs.other_sections
 
+# LaTeX passes are repeated until the files it reads back stop changing
+max_passes = 5
+aux_extensions = ['.aux','.toc','.out']
+# kept between builds when KeepAuxFiles is true
+state_extensions = aux_extensions +['.bbl','.bcf','.run.xml','.biber.json','.build.json']
+# files in the CV folder the document can read
+source_extensions = ['.tex','.sty','.cls','.cfg','.bbx','.cbx','.dbx','.lbx','.def','.csl','.png','.jpg','.jpeg','.eps','.pdf']
+
 def getSectionVals(config,section):
 	include = config.getboolean(section)
 	if include is None:
@@ -64,168 +86,169 @@ def getSectionVals(config,section):
 		years = defaultyears
 	return([include,years,max_pubs])
 	
-def make_cv_tables(config,table_dir):
+def make_cv_tables(config,table_dir,bib_database=None,manifest=None):
 	# override faculty source to be relative to CV folder
 	faculty_source = config['data_dir']
 	
 	if not os.path.exists(table_dir):
 		os.makedirs(table_dir)
+	
+	# sections whose inputs have not changed since the last run are skipped
+	save_manifest = manifest is None
+	if manifest is None:
+		manifest = TableManifest(table_dir,"explain" in config.keys() and config.getboolean("explain"))
 
  	# Scholarly Works
 	print('Updating scholarship tables')
 	filename = os.path.join(faculty_source,config['ScholarshipFile'])
 	if os.path.isfile(filename):
 		for Statname in ['GoogleStats','ScopusStats']:
-			fpstats = open(table_dir +os.sep +Statname +'.tex', 'w') # file to write
+			if not manifest.changed(Statname,[filename],[],[Statname +'.tex']):
+				continue
+			# parse the .bib file once and share it with all of the tables
+			if bib_database is None:
+				bib_database = load_bib(filename)
+			fpstats = io.StringIO() # table to write
 			if Statname == 'GoogleStats':
-				success = Google_stats2latex(fpstats,filename)
+				success = Google_stats2latex(fpstats,bib_database)
 			elif Statname == 'ScopusStats':
-				success = Scopus_stats2latex(fpstats,filename)
-			fpstats.close()
-			if not success:
-				os.remove(table_dir +os.sep +Statname +'.tex')
+				success = Scopus_stats2latex(fpstats,bib_database)
+			manifest.write_table(Statname +'.tex',fpstats.getvalue() if success else None)
+
+		# allow possibility of overriding category name 
+		categories = {}
+		for name in global_prefs.pub_categories:
+			categories[name] = name
+			if name +"Key" in config.keys():
+				categories[name] = config[name +"Key"]
 
 		for name in global_prefs.pub_categories:
 			[include,years,max_pubs] = getSectionVals(config,name)
-			if include:
-				# allow possibility of overriding category name 
-				category = name
-				if name +"Key" in config.keys():
-					category = config[name +"Key"]
-				with open(table_dir +os.sep +name +".tex", 'w') as fpubs:
-					nrecords = bib2latex_far(fpubs,filename,[category],years=years,max_pubs=max_pubs)
-				if not(nrecords > 0):
-					os.remove(table_dir+os.sep +name +".tex")
+			if include and manifest.changed(name,[filename],[categories[name],years,max_pubs],[name +'.tex']):
+				if bib_database is None:
+					bib_database = load_bib(filename)
+				# index all of the categories in one pass over the entries
+				get_keyword_index(bib_database,categories.values())
+				category = categories[name]
+				fpubs = io.StringIO() # table to write
+				nrecords = bib2latex_far(fpubs,bib_database,[category],years=years,max_pubs=max_pubs)
+				manifest.write_table(name +'.tex',fpubs.getvalue() if nrecords > 0 else None)
 	
 	# Personal Awards
 	[include,years,max_rows] = getSectionVals(config,'PersonalAwards')
-	if include:
+	filename = os.path.join(faculty_source,config['PersonalAwardsFile'])
+	if include and manifest.changed('PersonalAwards',[filename],[years,max_rows,config['ExcludeColumn']],['PersonalAwards.tex']):
 		print('Updating personal awards table')
-		fpawards = open(table_dir +os.sep +'PersonalAwards.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['PersonalAwardsFile'])
+		fpawards = io.StringIO() # table to write
 		nrows = personal_awards2latex(fpawards,years,filename,max_rows=max_rows,ExcludeColumn=config['ExcludeColumn'])
-		fpawards.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'PersonalAwards.tex')
+		manifest.write_table('PersonalAwards.tex',fpawards.getvalue() if nrows else None)
 	
 	# Student Awards
 	[include,years,max_rows] = getSectionVals(config,'StudentAwards')
-	if include:
+	filename = os.path.join(faculty_source,config['StudentAwardsFile'])
+	if include and manifest.changed('StudentAwards',[filename],[years,max_rows,config['ExcludeColumn']],['StudentAwards.tex']):
 		print('Updating student awards table')
-		fsawards = open(table_dir +os.sep +'StudentAwards.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['StudentAwardsFile'])
+		fsawards = io.StringIO() # table to write
 		nrows = student_awards2latex(fsawards,years,filename,max_rows=max_rows,ExcludeColumn=config['ExcludeColumn'])	
-		fsawards.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'StudentAwards.tex')
+		manifest.write_table('StudentAwards.tex',fsawards.getvalue() if nrows else None)
 	
 	# Service Activities
 	[include,years,max_rows] = getSectionVals(config,'Service')
-	if include:
+	filename = os.path.join(faculty_source,config['ServiceFile'])
+	if include and manifest.changed('Service',[filename],[years,max_rows,config['ExcludeColumn']],['Service.tex']):
 		print('Updating service table')
-		fservice = open(table_dir +os.sep +'Service.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['ServiceFile'])
+		fservice = io.StringIO() # table to write
 		nrows = service2latex(fservice,years,filename,'Service',max_rows=max_rows,ExcludeColumn=config['ExcludeColumn'])	
-		fservice.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Service.tex')
+		manifest.write_table('Service.tex',fservice.getvalue() if nrows else None)
 
 	# Professional Development
 	[include,years,max_rows] = getSectionVals(config,'ProfDevelopment')	
-	if include:
+	filename = os.path.join(faculty_source,config['ProfDevelopmentFile'])
+	if include and manifest.changed('ProfDevelopment',[filename],[years,max_rows,config['ExcludeColumn']],['ProfDevelopment.tex']):
 		print('Updating professional development table')
-		fprof_development = open(table_dir +os.sep +'ProfDevelopment.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['ProfDevelopmentFile'])
+		fprof_development = io.StringIO() # table to write
 		nrows = service2latex(fprof_development,years,filename,'Professional Development',max_rows=max_rows,ExcludeColumn=config['ExcludeColumn'])	
-		fprof_development.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'ProfDevelopment.tex')
+		manifest.write_table('ProfDevelopment.tex',fprof_development.getvalue() if nrows else None)
 
 	# Reviewing Activity
 	[include,years,max_rows] = getSectionVals(config,'Reviews')	
-	if include:
+	filename = os.path.join(faculty_source,config['ReviewsFile'])
+	if include and manifest.changed('Reviews',[filename],[years,max_rows],['Reviews.tex']):
 		print('Updating reviews table')
-		freviews = open(table_dir +os.sep +'Reviews.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['ReviewsFile'])
+		freviews = io.StringIO() # table to write
 		nrows = reviews2latex_far(freviews,years,filename,max_rows=max_rows)
-		freviews.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Reviews.tex')
+		manifest.write_table('Reviews.tex',freviews.getvalue() if nrows else None)
 	
 	# Graduate Advisees & Theses
 	[include,years,max_rows] = getSectionVals(config,'GradAdvisees')	
-	if include:
+	filename1 = os.path.join(faculty_source,config['CurrentGradAdviseesFile'])
+	filename2 = os.path.join(faculty_source,config['GradThesesFile'])
+	split = config.getboolean('SplitAdviseesAndTheses')
+	if include and manifest.changed('GradAdvisees',[filename1,filename2],[years,max_rows,split],['GradAdvisees.tex']):
 		print('Updating graduate advisees table')
-		fadvisees = open(table_dir +os.sep +'GradAdvisees.tex', 'w') # file to write
-		filename1 = os.path.join(faculty_source,config['CurrentGradAdviseesFile'])
-		filename2 = os.path.join(faculty_source,config['GradThesesFile'])
-		if config.getboolean('SplitAdviseesAndTheses'):
+		fadvisees = io.StringIO() # table to write
+		if split:
 			nrows = thesis2latex_far(fadvisees,years,filename1,"empty",max_rows=max_rows)
 		else:
 			nrows = thesis2latex_far(fadvisees,years,filename1,filename2,max_rows=max_rows)
-		fadvisees.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'GradAdvisees.tex')
+		manifest.write_table('GradAdvisees.tex',fadvisees.getvalue() if nrows else None)
 
 	# Theses
 	[include,years,max_rows] = getSectionVals(config,'Theses')	
-	if include and config.getboolean('SplitAdviseesAndTheses'):
+	filename = os.path.join(faculty_source,config['GradThesesFile'])
+	if include and config.getboolean('SplitAdviseesAndTheses') and manifest.changed('Theses',[filename],[years,max_rows],['Theses.tex']):
 		print('Updating graduate thesis table')
-		fthesis = open(table_dir +os.sep +'Theses.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['GradThesesFile'])
+		fthesis = io.StringIO() # table to write
 		nrows = thesis2latex_far(fthesis,years,"empty",filename,max_rows=max_rows)
-		fthesis.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Theses.tex')
+		manifest.write_table('Theses.tex',fthesis.getvalue() if nrows else None)
 	
 	# Undergraduate Research
 	[include,years,max_rows] = getSectionVals(config,'UndergradResearch')	
-	if include:
+	filename = os.path.join(faculty_source,config['UndergradResearchFile'])
+	if include and manifest.changed('UndergradResearch',[filename],[years,max_rows],['UndergradResearch.tex']):
 		print('Updating undergraduate research table')
-		fur = open(table_dir +os.sep +'UndergradResearch.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['UndergradResearchFile'])
+		fur = io.StringIO() # table to write
 		nrows = UR2latex(fur,years,filename,max_rows=max_rows)	
-		fur.close()
-		if not(nrows):
-			os.remove(table_dir +os.sep +'UndergradResearch.tex')
+		manifest.write_table('UndergradResearch.tex',fur.getvalue() if nrows else None)
 	
 	# Teaching
-	if config.getboolean('Teaching'):
+	filename = os.path.join(faculty_source,config['TeachingFile'])
+	hide_evals = config.getboolean('HideTeachingEvals')
+	short_table = config.getboolean('ShortTeachingTable')
+	sortbycourse = config.getboolean('SortTeachingByCourse')
+	if config.getboolean('Teaching') and manifest.changed('Teaching',[filename],[years,hide_evals,short_table,sortbycourse,config['ExcludeColumn']],['Teaching.tex']):
 		print('Updating teaching table')
-		fteaching = open(table_dir +os.sep +'Teaching.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['TeachingFile'])
-		hide_evals = config.getboolean('HideTeachingEvals')
-		if config.getboolean('ShortTeachingTable'):
+		fteaching = io.StringIO() # table to write
+		if short_table:
 			nrows = teaching2latex_short(fteaching,years,filename,private=hide_evals,ExcludeColumn=config['ExcludeColumn'])
 		else:
-			nrows = teaching2latex_far(fteaching,years,filename,sortbycourse=config.getboolean('SortTeachingByCourse'),private=hide_evals,ExcludeColumn=config['ExcludeColumn'])
-		fteaching.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Teaching.tex')
+			nrows = teaching2latex_far(fteaching,years,filename,sortbycourse=sortbycourse,private=hide_evals,ExcludeColumn=config['ExcludeColumn'])
+		manifest.write_table('Teaching.tex',fteaching.getvalue() if nrows else None)
 	
 	[include,years,max_rows] = getSectionVals(config,'Grants')	
-	if include:
+	filename = os.path.join(faculty_source,config['GrantsFile'])
+	if not os.path.isfile(filename):
+		filename = os.path.join(faculty_source,config['ProposalsFile'])
+	if include and manifest.changed('Grants',[filename],[years,max_rows],['Grants.tex']):
 		print('Updating grants table')
-		fgrants = open(table_dir +os.sep +'Grants.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['GrantsFile'])
-		if not os.path.isfile(filename):
+		if filename != os.path.join(faculty_source,config['GrantsFile']):
 			print('Falling back to using Proposals file for Grants table')
-			filename = os.path.join(faculty_source,config['ProposalsFile'])
+		fgrants = io.StringIO() # table to write
 		nrows = grants2latex_far(fgrants,years,filename,max_rows=max_rows)
-		fgrants.close()
-		if not(nrows):
-			os.remove(table_dir +os.sep +'Grants.tex')
+		manifest.write_table('Grants.tex',fgrants.getvalue() if nrows else None)
 	
 	# Proposals
 	[include,years,max_rows] = getSectionVals(config,'Proposals')	
-	if include:
+	filename = os.path.join(faculty_source,config['ProposalsFile'])
+	if include and manifest.changed('Proposals',[filename],[years,max_rows],['Proposals.tex']):
 		print('Updating proposals table')
-		fprops = open(table_dir +os.sep +'Proposals.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['ProposalsFile'])
+		fprops = io.StringIO() # table to write
 		nrows = props2latex_far(fprops,years,filename,max_rows=max_rows)	
-		fprops.close()
-		if not(nrows):
-			os.remove(table_dir +os.sep +'Proposals.tex')
+		manifest.write_table('Proposals.tex',fprops.getvalue() if nrows else None)
+	
+	if save_manifest:
+		manifest.save()
+	return(manifest)
 	
 
 def add_default_args(parser):
@@ -250,9 +273,12 @@ def add_default_args(parser):
 	parser.add_argument('-y','--years', help='number of years of data to include in tables',type=int)
 	parser.add_argument('-n','--NoCleanUp', help='Don''t delete autogenerated LaTex files after typset', action='store_true')
 	parser.add_argument('-v', '--verbose', help='Give verbose compilations output', action='store_true')
+	parser.add_argument('--explain', help='print why each table is made again and why the document is typeset', action='store_true')
 	parser.add_argument('-W','--WebScraperID', help='ScraperID (not necessary, but avoids Google blocking requests)')
 	parser.add_argument('-w','--UseWebScraper', help='Use scraper to avoid blocking by Google',  choices=['true','false'])
 	parser.add_argument('-q','--quiet', help='Import and classify citations without asking for guidance', action='store_true')
+	parser.add_argument('--offline', help='Use only web responses cached by earlier runs, make no web requests', action='store_true')
+	parser.add_argument('--record', help='Fetch every web response again and cache all of them for later --offline runs', action='store_true')
 
 def read_args(parser,argv):
 	if argv is None:
@@ -294,6 +320,8 @@ def read_args(parser,argv):
 			exit()
 		
 	global_prefs.quiet = args.quiet
+	global_prefs.offline = args.offline
+	global_prefs.record = args.record
 		
 	configuration = configparser.ConfigParser()
 	configuration.read(args.configfile)
@@ -368,6 +396,11 @@ def process_default_args(config,args):
 		config['verbose'] = 'true'
 	else:
 		config['verbose'] = 'false'
+		
+	if args.explain is True: 
+		config['explain'] = 'true'
+	else:
+		config['explain'] = 'false'
 	
 	if args.Exclude is not None:
 		for section in args.Exclude	:
@@ -411,6 +444,20 @@ def process_default_args(config,args):
 		config['GetNewScopusEntries'] = '0'
 	elif config['GetNewScopusEntries'] == 'true':
 		config['GetNewScopusEntries'] = '1'
+	
+	# days to keep cached web responses, e.g. orcidCacheDays = 7
+	for source in http_client.sources.keys():
+		if source +'CacheDays' in config.keys():
+			http_client.sources[source]['ttl'] = config.getfloat(source +'CacheDays')*http_client.day
+	
+	if global_prefs.offline:
+		# Scopus (pybliometrics), Google Scholar (scholarly) and btac make their own web requests
+		if config.getint('GetNewScopusEntries') != 0 or config.getint('GetNewGoogleEntries') != 0 or config.getboolean('UpdateCitations') or config.getboolean('SearchForDOIs'):
+			print('Offline: skipping Scopus, Google Scholar and DOI searches')
+		config['GetNewScopusEntries'] = '0'
+		config['GetNewGoogleEntries'] = '0'
+		config['UpdateCitations'] = 'false'
+		config['SearchForDOIs'] = 'false'
 		
 	# convert a reviewing history json file from Web of Science
 	reviewfile = config['ReviewsFile']
@@ -426,91 +473,123 @@ def process_default_args(config,args):
 				reviews2excel_orcid(config['ORCID'],xls)
 		config['ReviewsFile'] = name_extension_tuple[0] +'.xlsx'
 	
-	if config.getint('GetNewScopusEntries') != 0:
-		if not (config['ScopusID'] == ""):
-			print("Trying to find new .bib entries from Scopus")
-			pybliometrics.init()
-			filename = os.path.join(faculty_source,config['ScholarshipFile'])
-			backup_path= os.path.join(faculty_source,'make_cv','Backups')
-			copy_with_timestamp(filename, str(backup_path))
-			nyears = int(config['GetNewScopusEntries'])
-			bib_get_entries_scopus(filename,config['ScopusID'],nyears,filename)
-		else:
-			print("Can't get entries from Scopus without providing Scopus ID")
-
-	if config.getint('GetNewOrcidEntries') != 0:
-		if not (config['ORCID'] == ""):
-			print("Trying to find new .bib entries from ORCID")
-			filename = os.path.join(faculty_source,config['ScholarshipFile'])
-			backup_path= os.path.join(faculty_source,'make_cv','Backups')
-			copy_with_timestamp(filename, str(backup_path))
-			nyears = int(config['GetNewOrcidEntries'])
-			bib_get_entries_orcid(filename,config['ORCID'],nyears,filename)
-		else:
-			print("Can't get entries from ORCID without providing ORCID")
-
-	if config.getint('GetNewGoogleEntries') != 0:
-		if not (config['GoogleID'] == ""):
-			print("Trying to find new .bib entries from Google Scholar")
-			# read api key for uspto from .cache
-			odp_file = os.path.join('~','.cache', 'odp_api_key.txt')
-			if os.path.isfile(os.path.expanduser(odp_file)):
-				with open(os.path.expanduser(odp_file), 'r') as f:
-					global_prefs.odp_api_key = f.read().strip()
+	# Maintenance of the .bib file
+	# The file is read once, every enabled stage updates the same database in
+	# memory and the result is written back once at the end
+	filename = os.path.join(faculty_source,config['ScholarshipFile'])
+	if not os.path.isfile(filename):
+		print("Could not find " +filename +", skipping .bib file maintenance")
+		return(None)
+	
+	backup_path= os.path.join(faculty_source,'make_cv','Backups')
+	snapshot(filename, str(backup_path))
+	bib_database = load_bib(filename)
+	bib_index = BibIdentityIndex(bib_database.entries)
+	timings = []
+	
+	try:
+		stage_start = time.perf_counter()
+		if config.getint('GetNewScopusEntries') != 0:
+			if not (config['ScopusID'] == ""):
+				print("Trying to find new .bib entries from Scopus")
+				pybliometrics.init()
+				nyears = int(config['GetNewScopusEntries'])
+				# days before the list of documents cached by pybliometrics is refreshed
+				refresh = 10
+				if "ScopusRefreshDays" in config.keys():
+					refresh = config.getint("ScopusRefreshDays")
+				bib_get_entries_scopus(bib_database,config['ScopusID'],nyears,bib_index,refresh)
+				timings.append(['Scopus entries',time.perf_counter() -stage_start])
 			else:
-				print("USPTO's Open Data Portal API key not found in ~/.cache/odp_api_key.txt for looking up patent information from Google Scholar.")
-				print("Follow the instructions here: https://data.uspto.gov/home")
-				global_prefs.odp_api_key = input("Enter key and press Enter to continue... or hit enter to skip patent lookup\n")
-				if global_prefs.odp_api_key != "":
-					with open(os.path.expanduser(odp_file), 'w') as f:
-						f.write(global_prefs.odp_api_key)
-				else:
-					global_prefs.odp_api_key = None
+				print("Can't get entries from Scopus without providing Scopus ID")
 
-			filename = os.path.join(faculty_source,config['ScholarshipFile'])
-			backup_path= os.path.join(faculty_source,'make_cv','Backups')
-			copy_with_timestamp(filename, str(backup_path))
-			nyears = int(config['GetNewGoogleEntries'])
-			bib_get_entries_google(filename,config['GoogleID'],nyears,filename,webscraperID)
-		else:
-			print("Can't get entries from Google without providing Google ID")
-	
-	# add/update citations counts in .bib file	
-	if config.getboolean('UpdateCitations'):
-		print("Updating citation counts using Google Scholar")
-		if not config['GoogleID'] == "":
-			filename = os.path.join(faculty_source,config['ScholarshipFile'])
-			backup_path= os.path.join(faculty_source,'make_cv','Backups')
-			copy_with_timestamp(filename, str(backup_path))
-			bib_add_citations(filename,config['GoogleID'],filename,webscraperID)
-		else:
-			print("Can't update citations without providing Google ID")
+		stage_start = time.perf_counter()
+		if config.getint('GetNewOrcidEntries') != 0:
+			if not (config['ORCID'] == ""):
+				print("Trying to find new .bib entries from ORCID")
+				nyears = int(config['GetNewOrcidEntries'])
+				bib_get_entries_orcid(bib_database,config['ORCID'],nyears,bib_index)
+				timings.append(['ORCID entries',time.perf_counter() -stage_start])
+			else:
+				print("Can't get entries from ORCID without providing ORCID")
+
+		if config.getint('GetNewGoogleEntries') != 0:
+			if not (config['GoogleID'] == ""):
+				print("Trying to find new .bib entries from Google Scholar")
+				# read api key for uspto from .cache
+				odp_file = os.path.join('~','.cache', 'odp_api_key.txt')
+				if os.path.isfile(os.path.expanduser(odp_file)):
+					with open(os.path.expanduser(odp_file), 'r') as f:
+						global_prefs.odp_api_key = f.read().strip()
+				else:
+					print("USPTO's Open Data Portal API key not found in ~/.cache/odp_api_key.txt for looking up patent information from Google Scholar.")
+					print("Follow the instructions here: https://data.uspto.gov/home")
+					global_prefs.odp_api_key = input("Enter key and press Enter to continue... or hit enter to skip patent lookup\n")
+					if global_prefs.odp_api_key != "":
+						with open(os.path.expanduser(odp_file), 'w') as f:
+							f.write(global_prefs.odp_api_key)
+					else:
+						global_prefs.odp_api_key = None
+
+				stage_start = time.perf_counter()
+				nyears = int(config['GetNewGoogleEntries'])
+				bib_get_entries_google(bib_database,config['GoogleID'],nyears,webscraperID,bib_index)
+				timings.append(['Google Scholar entries',time.perf_counter() -stage_start])
+			else:
+				print("Can't get entries from Google without providing Google ID")
+	
+		# add/update citations counts in .bib file	
+		stage_start = time.perf_counter()
+		if config.getboolean('UpdateCitations'):
+			print("Updating citation counts using Google Scholar")
+			if not config['GoogleID'] == "":
+				bib_add_citations(bib_database,config['GoogleID'],webscraperID,bib_index)
+				timings.append(['Citation counts',time.perf_counter() -stage_start])
+			else:
+				print("Can't update citations without providing Google ID")
 		
-	# add/update citations counts in .bib file	
-	if config.getboolean('UpdateStudentMarkers'):
-		print("Updating student markers in .bib file")
-		filename = os.path.join(faculty_source,config['ScholarshipFile'])
-		backup_path= os.path.join(faculty_source,'make_cv','Backups')
-		copy_with_timestamp(filename, str(backup_path))
-		cur_grads = os.path.join(faculty_source,config['CurrentGradAdviseesFile'])
-		gradfile = os.path.join(faculty_source,config['GradThesesFile'])
-		ugradfile = os.path.join(faculty_source,config['UndergradResearchFile'])
-		bib_add_student_markers(100,ugradfile,gradfile,cur_grads,filename,filename)
+		# add/update citations counts in .bib file	
+		stage_start = time.perf_counter()
+		if config.getboolean('UpdateStudentMarkers'):
+			print("Updating student markers in .bib file")
+			cur_grads = os.path.join(faculty_source,config['CurrentGradAdviseesFile'])
+			gradfile = os.path.join(faculty_source,config['GradThesesFile'])
+			ugradfile = os.path.join(faculty_source,config['UndergradResearchFile'])
+			bib_add_student_markers(100,ugradfile,gradfile,cur_grads,bib_database)
+			timings.append(['Student markers',time.perf_counter() -stage_start])
 		
-	if config.getboolean('SearchForDOIs'):
-		filename = os.path.join(faculty_source,config['ScholarshipFile'])
-		backup_path= os.path.join(faculty_source,'make_cv','Backups')
-		copy_with_timestamp(filename, str(backup_path))
-		subprocess.run(["btac", "-i","-v","-c","doi","-m",filename])
-		# I think btac deletes the comments from a .bib file so I need to add them back in?
-
-	# Check for missing keywords in .bib file
-	filename = os.path.join(faculty_source,config['ScholarshipFile'])
-	if os.path.isfile(filename):
+		stage_start = time.perf_counter()
+		if config.getboolean('SearchForDOIs'):
+			# btac works on the file itself so write what we have and read back its changes
+			write_bib(bib_database,filename)
+			subprocess.run(["btac", "-i","-v","-c","doi","-m",filename])
+			# I think btac deletes the comments from a .bib file so I need to add them back in?
+			bib_database = load_bib(filename)
+			timings.append(['DOI search',time.perf_counter() -stage_start])
+		
+		# Check for missing keywords in .bib file
+		stage_start = time.perf_counter()
 		print('Checking for .bib entries that are missing type specifiers')
-		backup_path= os.path.join(faculty_source,'make_cv','Backups')
-		copy_with_timestamp(filename, str(backup_path))
-		bib_add_keywords(filename,filename)
+		bib_add_keywords(bib_database)
+		timings.append(['Type keywords',time.perf_counter() -stage_start])
+	except (Exception, KeyboardInterrupt):
+		# keep the entries accepted before the interruption or error
+		print('\nStopped, saving the .bib entries added so far')
+		write_bib(bib_database,filename)
+		save_sync_states()
+		raise
+	
+	stage_start = time.perf_counter()
+	write_bib(bib_database,filename)
+	# only now are the entries accepted from each source safe
+	save_sync_states()
+	timings.append(['Writing .bib file',time.perf_counter() -stage_start])
+	
+	print('.bib file maintenance times:')
+	for [stage,seconds] in timings:
+		print(f'  {stage}: {seconds:.2f} s')
+	
+	return(bib_database)
 
 def add_timestamp_to_cv():
 	# Get current timestamp
@@ -529,6 +608,130 @@ def add_timestamp_to_cv():
 	with open('timestamp.tex', 'w') as f:
 		f.write(timestamp_tex)
 		
+def aux_state(filename):
+	# hashes of the files LaTeX reads back on its next pass
+	state = []
+	for ext in aux_extensions:
+		try:
+			with open(filename +ext,'rb') as f:
+				state.append(hashlib.sha256(f.read()).hexdigest())
+		except OSError:
+			state.append(None)
+	return(state)
+
+def read_bcf(filename):
+	# the .bib files and the citation keys in the .bcf LaTeX wrote for biber
+	with open(filename +".bcf",encoding='utf-8',errors='replace') as f:
+		bcf = f.read()
+	datasources = re.findall(r'<bcf:datasource[^>]*>([^<]+)</bcf:datasource>',bcf)
+	keys = re.findall(r'<bcf:citekey[^>]*>([^<]+)</bcf:citekey>',bcf)
+	return(datasources,keys)
+
+def cited_bib(config,filename):
+	# Writes the entries the document cites to Tables_<filename>/cited.bib so
+	# biber does not have to read the whole scholarship file.  Returns
+	# {the scholarship file as named in the .bcf: cited.bib}, empty if biber
+	# should read the files named in the .bcf
+	bibfile = os.path.join(config['data_dir'],config['ScholarshipFile'])
+	[datasources,keys] = read_bcf(filename)
+	names = [name for name in datasources if os.path.isfile(name) and os.path.isfile(bibfile) and os.path.samefile(name,bibfile)]
+	if not names:
+		return({})
+	cited = 'Tables_' +filename +'/cited.bib'
+	if not write_cited_bib(bibfile,keys,cited):
+		return({})
+	return({name: cited for name in names})
+
+def biber_inputs(filename,sources):
+	# what the .bbl biber writes depends on: the .bcf (cited keys and options),
+	# the .bib files it reads, the data model and the biber executable
+	bcf = file_hash(filename +".bcf")
+	biber = shutil.which("biber")
+	if bcf is None or biber is None:
+		return(None)
+	[datasources,keys] = read_bcf(filename)
+	inputs = {'bcf': bcf, 'biblatex-dm.cfg': file_hash('biblatex-dm.cfg'), 'biber': [biber,os.path.getmtime(biber),os.path.getsize(biber)], 'sources': sources}
+	for datasource in datasources:
+		inputs[datasource] = file_hash(sources.get(datasource,datasource))
+		if inputs[datasource] is None:
+			return(None)
+	return(inputs)
+
+def run_biber(filename,sources):
+	# biber is skipped when the .bbl from the last run was made from the same inputs
+	# sources maps .bib files named in the .bcf to the files biber should read instead
+	bcffile = filename +".bcf"
+	manifest = filename +".biber.json"
+	inputs = biber_inputs(filename,sources)
+	if inputs is not None and os.path.exists(filename +".bbl"):
+		try:
+			with open(manifest,'r') as f:
+				if json.load(f) == inputs:
+					print("Bibliography unchanged, using " +filename +".bbl from the last run")
+					return
+		except (OSError, ValueError):
+			pass
+	
+	if os.path.exists(manifest):
+		os.remove(manifest)
+	if sources:
+		# LaTeX writes the .bcf again on its next pass
+		with open(bcffile,encoding='utf-8') as f:
+			bcf = f.read()
+		for name,source in sources.items():
+			bcf = bcf.replace('>' +name +'</bcf:datasource>','>' +source +'</bcf:datasource>')
+		with open(bcffile,'w',encoding='utf-8') as f:
+			f.write(bcf)
+	subprocess.run(["biber", bcffile],check=True)
+	if inputs is not None:
+		with open(manifest,'w') as f:
+			json.dump(inputs,f)
+
+def build_inputs(config,filename,command):
+	# hashes of everything the typeset document can depend on: the files in
+	# the CV folder (including exclusions.tex, which has the settings), the
+	# tables, the personal data folder and the .bib file
+	files = []
+	for name in os.listdir('.'):
+		[stem,ext] = os.path.splitext(name)
+		# a .pdf with a .tex of the same name is an output
+		if ext.lower() in source_extensions and not (ext.lower() == '.pdf' and os.path.exists(stem +'.tex')):
+			files.append(name)
+	# cited.bib is made from the .bib file while typesetting
+	files += [name for name in glob.glob(os.path.join('Tables_' +filename,'*')) if not os.path.basename(name) in [manifest_file,'cited.bib']]
+	for folder,dirs,names in os.walk(config['bio_dir']):
+		files += [os.path.join(folder,name) for name in names]
+	files.append(os.path.join(config['data_dir'],config['ScholarshipFile']))
+	inputs = {'command': command}
+	for name in sorted(files):
+		if os.path.isfile(name):
+			inputs[name] = file_hash(name)
+	return(inputs)
+
+def changed_input(previous,inputs):
+	# the first input that differs from the last build
+	if previous is None:
+		return('there is no record of the last build')
+	for name in inputs.keys():
+		if previous.get(name) != inputs[name]:
+			return(name +' changed')
+	for name in previous.keys():
+		if not name in inputs:
+			return(name +' was removed')
+	return(None)
+
+def clean_up(config,filename):
+	if "NoCleanUp" in config.keys() and not(config.getboolean("NoCleanUp")):
+		files = [filename +".blg",filename +".log","biblatex-dm.cfg","exclusions.tex","timestamp.tex"]
+		# the next build can start from these if asked to keep them
+		if not ("KeepAuxFiles" in config.keys() and config.getboolean("KeepAuxFiles")):
+			files += [filename +ext for ext in state_extensions]
+		for file in files:
+			try:
+				os.remove(file)
+			except OSError as err:
+				pass
+
 def typeset(config,filename,command):
 	# Create exclusion file
 	with open('exclusions.tex', 'w') as exclusions:
@@ -564,8 +767,29 @@ def typeset(config,filename,command):
 	
 	bcffile = filename +".bcf"
 	pdffile = filename +".pdf"
+	verbose = "verbose" in config.keys() and config.getboolean("verbose")
+	
+	# nothing to do if no table, template or .bib file changed since the last build
+	build_file = filename +".build.json"
+	inputs = build_inputs(config,filename,command)
+	previous = None
+	try:
+		with open(build_file,'r') as f:
+			previous = json.load(f)
+	except (OSError, ValueError):
+		pass
+	reason = changed_input(previous,inputs)
+	if reason is None and os.path.exists(pdffile):
+		print("Nothing changed since " +pdffile +" was made, skipping typesetting")
+		clean_up(config,filename)
+		return
+	if "explain" in config.keys() and config.getboolean("explain"):
+		print("Typesetting because " +(reason if reason is not None else pdffile +" is missing"))
+	if os.path.exists(build_file):
+		os.remove(build_file)
+	
 	print("\ntypesetting pass 1\n")
-	if "verbose" in config.keys() and config.getboolean("verbose"):
+	if verbose:
 		print(command)
 		subprocess.run(command,check=True) 
 	else:
@@ -573,12 +797,10 @@ def typeset(config,filename,command):
 	
 	print("\ncreating bibliography\n")
 	if os.path.exists(bcffile):
-		subprocess.run(["biber", bcffile],check=True)
+		run_biber(filename,cited_bib(config,filename))
 	else:
 		print(f"{bcffile} not found, skipping biber") 
 	
-	print("\ntypesetting pass 2\n")
-	subprocess.run(command,stdout=subprocess.DEVNULL,stderr=subprocess.STDOUT)
 	print("Trying to delete " +filename +".pdf file.  If this gets stuck, delete " +filename +".pdf yourself and the compilation should continue")
 	print("If it doesn't, hit ctrl-c, delete " +filename +".pdf and try again")
 	while True:
@@ -588,18 +810,28 @@ def typeset(config,filename,command):
 			break
 		except OSError as err:
 			continue
-	print("\ntypesetting pass 3\n")
-	subprocess.run(command,stdout=subprocess.DEVNULL,stderr=subprocess.STDOUT) 
-	print("\ntypesetting pass 4\n")
-	ps = subprocess.run(command)
 	
-	# cleanup
-	if "NoCleanUp" in config.keys() and not(config.getboolean("NoCleanUp")):
-		for file in [filename +".aux",filename +".bbl",filename +".bcf",filename +".blg",filename +".log",filename +".out",filename +".run.xml","biblatex-dm.cfg",filename +".toc","exclusions.tex","timestamp.tex"]:
-			try:
-				os.remove(file)
-			except OSError as err:
-				pass
+	# run LaTeX again until a pass reads back the same .aux/.toc/.out files it writes
+	state = aux_state(filename)
+	for npass in range(2,max_passes +1):
+		print("\ntypesetting pass " +str(npass) +"\n")
+		if verbose:
+			ps = subprocess.run(command)
+		else:
+			ps = subprocess.run(command,stdout=subprocess.DEVNULL,stderr=subprocess.STDOUT)
+		new_state = aux_state(filename)
+		if new_state == state:
+			break
+		state = new_state
+	else:
+		print("Cross references still changing after " +str(max_passes) +" passes")
+	if ps.returncode != 0:
+		print("LaTeX reported errors, see " +filename +".log")
+	else:
+		with open(build_file,'w') as f:
+			json.dump(inputs,f)
+	
+	clean_up(config,filename)
 
 
 def main(argv = None):
@@ -610,11 +842,12 @@ def main(argv = None):
 	[configuration,args] = read_args(parser,argv)
 	
 	config = configuration['CV']
-	process_default_args(config,args)
+	bib_database = process_default_args(config,args)
 	
 	stem = config['LaTexFile'][:-4]
 	folder = "Tables_" +stem
-	make_cv_tables(config,folder)
+	manifest = make_cv_tables(config,folder,bib_database)
+	manifest.report()
 	if "verbose" in config.keys() and config.getboolean("verbose"):
 		typeset(config,stem,['xelatex',config['LaTexFile']])
 	else:
@@ -4,6 +4,7 @@
 # script folder must be in path
 
 import os
+import io
 import sys
 import subprocess
 import glob
@@ -13,6 +14,7 @@ import shutil
 import configparser
 import argparse
 import warnings
+import re
 from pathlib import Path
 
 from .bib2latex_far import bib2latex_far
@@ -22,6 +24,7 @@ from .make_cv import typeset
 from .make_cv import add_default_args
 from .make_cv import process_default_args
 from .make_cv import read_args
+from .table_manifest import TableManifest
 
 from .UR2latex_far import UR2latex_far
 from .personal_awards2latex_far import personal_awards2latex_far
@@ -31,69 +34,75 @@ from .teaching2latex_far import teaching2latex_far
 from .teaching2latex_short import teaching2latex_short
 from .advising2latex_far import advising2latex_far	
 
+from .bib_io import write_cited_bib
 from . import global_prefs
 
-def make_far_tables(config,table_dir):
+def cited_keys(tex_files):
+	# the keys of the \textcite/\fullcite/\nocite commands in the .tex files
+	keys = []
+	for tex_file in tex_files:
+		with open(tex_file,encoding='utf-8',errors='replace') as f:
+			for match in re.finditer(r'\\[A-Za-z]*cite\*?(?:\[[^]]*\])*\{([^}]*)\}',f.read()):
+				keys += [key.strip() for key in match.group(1).split(',')]
+	return(keys)
+
+def make_far_tables(config,table_dir,bib_database=None):
 	# default to writing entire history
 	years = config.getint('years')
 	
-	make_cv_tables(config,table_dir)
+	# the far versions of some tables replace the cv versions, so both share
+	# one manifest
+	manifest = TableManifest(table_dir,"explain" in config.keys() and config.getboolean("explain"))
+	make_cv_tables(config,table_dir,bib_database,manifest)
 	
 	# override faculty source to be relative to CV folder
 	faculty_source = config['data_dir']
 
 	# Personal Awards
-	if config.getboolean('PersonalAwards'):
+	filename = os.path.join(faculty_source,config['PersonalAwardsFile'])
+	if config.getboolean('PersonalAwards') and manifest.changed('PersonalAwards_far',[filename],[years],['PersonalAwards.tex']):
 		print('Updating personal awards table')
-		fpawards = open(table_dir +os.sep +'PersonalAwards.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['PersonalAwardsFile'])
+		fpawards = io.StringIO() # table to write
 		nrows = personal_awards2latex_far(fpawards,years,filename)
-		fpawards.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'PersonalAwards.tex')
+		manifest.write_table('PersonalAwards.tex',fpawards.getvalue() if nrows else None)
 	
 	# Student Awards
-	if config.getboolean('StudentAwards'):
+	filename = os.path.join(faculty_source,config['StudentAwardsFile'])
+	if config.getboolean('StudentAwards') and manifest.changed('StudentAwards_far',[filename],[years],['StudentAwards.tex']):
 		print('Updating student awards table')
-		fsawards = open(table_dir +os.sep +'StudentAwards.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['StudentAwardsFile'])
+		fsawards = io.StringIO() # table to write
 		nrows = student_awards2latex_far(fsawards,years,filename)	
-		fsawards.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'StudentAwards.tex')
+		manifest.write_table('StudentAwards.tex',fsawards.getvalue() if nrows else None)
 	
 	# Service Activities
-	if config.getboolean('Service'):
+	filename = os.path.join(faculty_source,config['ServiceFile'])
+	if config.getboolean('Service') and manifest.changed('Service_far',[filename],[years],['Service.tex']):
 		print('Updating service table')
-		fservice = open(table_dir +os.sep +'Service.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['ServiceFile'])
+		fservice = io.StringIO() # table to write
 		nrows = service2latex_far(fservice,years,filename)	
-		fservice.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Service.tex')
+		manifest.write_table('Service.tex',fservice.getvalue() if nrows else None)
 			
 	# Undergraduate Advising Counts
 	filename = faculty_source +os.sep +"Service" +os.sep + "advisee counts.xlsx"
-	if Path(filename).is_file():
+	if Path(filename).is_file() and manifest.changed('AdviseeCounts',[filename],[],['AdviseeCounts.tex']):
 		print('Updating advisee counts')
 		df = pd.read_excel(filename,skiprows=0)
 		nadvisees = df["Count Distinct Name"].iloc[-1]
-		fadv = open(table_dir +os.sep +'AdviseeCounts.tex', 'w') # file to write
+		fadv = io.StringIO() # table to write
 		fadv.write("Current undergraduate advisees: " +str(nadvisees) +" \\par\n")
-		fadv.close()
+		manifest.write_table('AdviseeCounts.tex',fadv.getvalue())
 
 	#Undergraduate Advising Evaluations
 	filename = faculty_source +os.sep +"Service" +os.sep + "advising evaluation data.xlsx"
-	if Path(filename).is_file():
+	if Path(filename).is_file() and manifest.changed('AdvisingEvals',[filename],[years],['AdvisingEvals.tex']):
 		print('Updating advisee evals')
-		f = open(table_dir +os.sep +'AdvisingEvals.tex', 'w') # file to write
+		f = io.StringIO() # table to write
 		advising2latex_far(f,years,filename,private=False)
-		f.close()
+		manifest.write_table('AdvisingEvals.tex',f.getvalue())
 		
-		filename = faculty_source +os.sep +"Proposals & Grants" +os.sep + "expenditures.xlsx"
-
 	# Expenditures
-	if Path(filename).is_file():
+	filename = faculty_source +os.sep +"Proposals & Grants" +os.sep + "expenditures.xlsx"
+	if Path(filename).is_file() and manifest.changed('Expenditures',[filename],[],['Expenditures.tex']):
 		print('Updating expenditures')
 		df = pd.read_excel(filename,skiprows=0)
 		expenditures = df["Expenditure"].iloc[-1]
@@ -101,45 +110,45 @@ def make_far_tables(config,table_dir):
 		tuition = df["Tuition"].iloc[-1]
 		recovery = df["Salary Recovery"].iloc[-1]
 		year = df["Year"].iloc[-1]
-		f = open(table_dir +os.sep +'Expenditures.tex', 'w') # file to write
+		f = io.StringIO() # table to write
 		f.write(f"{year}: expenditures \\${expenditures:.2f}, indirect \\${indirect:.2f}, tuition \\${tuition:.2f}, salary recovery \\${recovery:.2f} \\par\n")
-		f.close()
+		manifest.write_table('Expenditures.tex',f.getvalue())
 		
 	# Prospective Visit Counts
 	filename = faculty_source +os.sep +"Service" +os.sep + "prospective visit data.xlsx"
-	if Path(filename).is_file():
+	if Path(filename).is_file() and manifest.changed('ProspectiveVisits',[filename],[],['ProspectiveVisits.tex']):
 		print('Updating prospective visit counts')
 		df = pd.read_excel(filename,skiprows=0)
 		nvisits = df["Visits"].iloc[-1]
 		ndeposits = df["Deposits"].iloc[-1]
 		nyear = df["Year"].iloc[-1]
-		f = open(table_dir +os.sep +'ProspectiveVisits.tex', 'w') # file to write
+		f = io.StringIO() # table to write
 		f.write(f"Prospective visits in {nyear}: {nvisits} with {ndeposits} deposits \\par\n")
-		f.close()
+		manifest.write_table('ProspectiveVisits.tex',f.getvalue())
 	
 	# Undergraduate Research
-	if config.getboolean('UndergradResearch'):
+	filename = os.path.join(faculty_source,config['UndergradResearchFile'])
+	if config.getboolean('UndergradResearch') and manifest.changed('UndergradResearch_far',[filename],[years],['UndergradResearch.tex']):
 		print('Updating undergraduate research table')
-		fur = open(table_dir +os.sep +'UndergradResearch.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['UndergradResearchFile'])
+		fur = io.StringIO() # table to write
 		nrows = UR2latex_far(fur,years,filename)	
-		fur.close()
-		if not(nrows):
-			os.remove(table_dir +os.sep +'UndergradResearch.tex')
+		manifest.write_table('UndergradResearch.tex',fur.getvalue() if nrows else None)
 	
 	# Teaching
-	if config.getboolean('Teaching'):
+	filename = os.path.join(faculty_source,config['TeachingFile'])
+	hide_evals = config.getboolean('HideTeachingEvals')
+	short_table = config.getboolean('ShortTeachingTable')
+	if config.getboolean('Teaching') and manifest.changed('Teaching_far',[filename],[years,hide_evals,short_table],['Teaching.tex']):
 		print('Updating teaching table')
-		fteaching = open(table_dir +os.sep +'Teaching.tex', 'w') # file to write
-		filename = os.path.join(faculty_source,config['TeachingFile'])
-		hide_evals = config.getboolean('HideTeachingEvals')
-		if config.getboolean('ShortTeachingTable'):
+		fteaching = io.StringIO() # table to write
+		if short_table:
 			nrows = teaching2latex_short(fteaching,years,filename,private=hide_evals)
 		else:
 			nrows = teaching2latex_far(fteaching,years,filename,sortbycourse=False,private=hide_evals)
-		fteaching.close()
-		if not(nrows):
-			os.remove(table_dir+os.sep +'Teaching.tex')
+		manifest.write_table('Teaching.tex',fteaching.getvalue() if nrows else None)
+	
+	manifest.save()
+	return(manifest)
 
 def main(argv = None):
 	warnings.filterwarnings('ignore', category=UserWarning, module='openpyxl')
@@ -149,16 +158,24 @@ def main(argv = None):
 
 	[configuration,args] = read_args(parser,argv)
 	config = configuration['CV']
-	process_default_args(config,args)
+	bib_database = process_default_args(config,args)
 	global_prefs.usePandoc = (args.pandoc or config.getboolean('UsePandoc'))
 
 	stem = config['LaTexFile'][:-4]
 	folder = "Tables_" +stem
-	make_far_tables(config,folder)
+	manifest = make_far_tables(config,folder,bib_database)
+	manifest.report()
 	
 	if global_prefs.usePandoc:
 		docxfile = config['LaTexFile'][0:-4] +".docx"
-		subprocess.run(['pandoc','--citeproc','--csl=no-bib-full.csl','--toc',config['LaTexFile'],'-o',docxfile],check=True)
+		command = ['pandoc','--citeproc','--csl=no-bib-full.csl','--toc',config['LaTexFile'],'-o',docxfile]
+		# give pandoc only the entries the report cites
+		bibfile = os.path.join(config['data_dir'],config['ScholarshipFile'])
+		cited = folder +'/cited.bib'
+		keys = cited_keys([config['LaTexFile']] +glob.glob(os.path.join(folder,'*.tex')) +glob.glob(os.path.join(config['bio_dir'],'*.tex')))
+		if os.path.isfile(bibfile) and write_cited_bib(bibfile,keys,cited):
+			command.insert(2,'--bibliography=' +cited)
+		subprocess.run(command,check=True)
 	else:
 		typeset(config,stem,['xelatex',config['LaTexFile']])
 
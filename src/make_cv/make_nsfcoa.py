@@ -29,12 +29,7 @@ from .stringprotect import abbreviate_name
 from .stringprotect import split_names
 from .stringprotect import last_first
 from .thesis2latex_far import read_thesis_bib
-
-import bibtexparser
-from bibtexparser.bwriter import BibTexWriter
-from bibtexparser.bibdatabase import BibDatabase
-from bibtexparser.customization import convert_to_unicode
-from bibtexparser.bparser import BibTexParser
+from .bib_reader import entry_filter
 
 from pylatexenc.latex2text import LatexNodes2Text
 
@@ -45,17 +40,11 @@ def getyear(paperbibentry):
 		return int(paperbibentry["date"][:4])
 	return 0
 
-def get_collaborator_list(config, output_format):
+def get_collaborator_list(config, bib_database, output_format):
 	years = config.getint('years')
 
 	faculty_source = config['data_dir']
 	
-	bibfile = os.path.join(faculty_source, config['ScholarshipFile'])
-	with open(bibfile,encoding='utf-8') as bibtex_file:
-		bibtex_str = bibtex_file.read()
-	tbparser = BibTexParser(common_strings=True)
-	bib_database = bibtexparser.loads(bibtex_str, tbparser)
-	
 	cur_grad = os.path.join(faculty_source, config['CurrentGradAdviseesFile'])
 	try:
 		cur_grad_names = pd.read_excel(cur_grad, sheet_name="Data", parse_dates=['Start Date'])
@@ -90,9 +79,8 @@ def get_collaborator_list(config, output_format):
 		print("Could not open/read file: " + grantfile)
 		grants = pd.DataFrame(columns=["Proposal_ID","Faculty","Sponsor","Allocated Amt","Total Cost","Funded?","Title","Begin Date","End Date","Submit Date","Principal Investigators"])
 		
+	year = date.today().year
 	if years > 0:
-		today = date.today()
-		year = today.year
 		begin_year = year - years
 	else:
 		begin_year = 0
@@ -123,25 +111,23 @@ def get_collaborator_list(config, output_format):
 		advisees_list.append([student_name, '8/1/' + str(row["Year"])])
 	
 	grad_list['Student'] = grad_list['Student'].apply(lambda x: abbreviate_name(x, first_initial_only=True))
-	for icpbe, paperbibentry in enumerate(bib_database.entries):
+	# only entries in the time window with authors matter
+	in_window = entry_filter(begin_year, has_author=True)
+	for paperbibentry in filter(in_window, bib_database.entries):
 		year = getyear(paperbibentry)
-		if not (year >= begin_year):
-			continue
-		
-		if "author" in paperbibentry.keys():
-			authstr = paperbibentry['author']
-			authstr = re.sub("\\\\gs", "", authstr)
-			authstr = re.sub("\\\\us", "", authstr)
-			author_list = split_names(authstr)
-			for author in author_list:
-				abbrev = abbreviate_name(author, first_initial_only=True)
-				if abbrev in grad_list['Student'].values:
-					continue
-				key = last_first(abbrev)
-				if key in collab_list.keys():
-					collab_list[key] = (last_first(author), max(year, collab_list[key][-1]))
-				else:
-					collab_list[key] = (last_first(author), year)
+		authstr = paperbibentry['author']
+		authstr = re.sub("\\\\gs", "", authstr)
+		authstr = re.sub("\\\\us", "", authstr)
+		author_list = split_names(authstr)
+		for author in author_list:
+			abbrev = abbreviate_name(author, first_initial_only=True)
+			if abbrev in grad_list['Student'].values:
+				continue
+			key = last_first(abbrev)
+			if key in collab_list.keys():
+				collab_list[key] = (last_first(author), max(year, collab_list[key][-1]))
+			else:
+				collab_list[key] = (last_first(author), year)
 						
 	# add grant collaborators
 	grants = grants[pd.to_datetime(grants['End Date'], errors='coerce').dt.year >= begin_year]
@@ -197,9 +183,11 @@ def main(argv=None):
 	[configuration, args] = read_args(parser, argv)
 	
 	config = configuration['CV']
-	process_default_args(config, args)
+	bib_database = process_default_args(config, args)
+	if bib_database is None:
+		return
 
-	get_collaborator_list(config, args.format)
+	get_collaborator_list(config, bib_database, args.format)
 
 if __name__ == "__main__":
 	main()
@@ -31,7 +31,8 @@ def main(argv = None):
 	[configuration,args] = read_args(parser,argv)
 	
 	config = configuration['CV']
-	process_default_args(config,args)
+	# the .bib file is parsed once and shared by all of the web pages
+	bib_database = process_default_args(config,args)
 	global_prefs.usePandoc = True
 
 	tex_files = glob.glob("*.tex")
@@ -43,7 +44,7 @@ def main(argv = None):
 		print("compiling " +tex_file)
 		stem = tex_file[0:-4]
 		folder = "Tables_" +stem
-		make_far_tables(config,folder)
+		make_far_tables(config,folder,bib_database)
 
 		typeset(config,stem,["mk4ht", "htlatex",stem +".tex","xhtml,3,next,charset=utf-8,pmathml","-cunihtf -utf8 -cvalidate"])		
 		# Replace css file
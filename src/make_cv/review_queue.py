@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Review of the new entries found by the bib_get_entries_* scripts
+# The fetchers look up and complete all of their new entries first and then
+# pass them here, so the questions come one after the other without waiting on
+# the network.  Each entry is shown with its guessed type and can be added
+# (y), skipped (return or n) or added as another type (its number), or all of
+# the remaining entries can be added (a) or skipped (q).  An accepted entry is
+# put in the database straight away, so if the review is interrupted make_cv
+# still saves the entries accepted so far.
+
+import bibtexparser
+from bibtexparser.bwriter import BibTexWriter
+
+from . import global_prefs
+from .bib_io import bib_parser
+from .bib_io import entry_year
+from .bib_identity_index import make_title_id
+from .bib_add_keywords import guess_type
+from .bib_add_keywords import check_keyword_exists
+from .bib_add_keywords import pub_categories
+
+def already_added(entry, bib_index):
+	# an earlier entry of the review may have been another version of this one
+	if bib_index.find_doi(entry.get('doi')) or bib_index.find_google_pub_id(entry.get('google_pub_id')):
+		return(True)
+	title = entry.get('title')
+	return(bool(title and bib_index.find_title(make_title_id(title, entry_year(entry)))))
+
+def ask(keyword):
+	# returns the type to add the entry as, 'skip' or 'all'/'none' for the rest
+	while True:
+		response = input('Add as ' +keyword +'? [y/N/number/a/q] ').strip().lower()
+		if response == 'y':
+			return(keyword)
+		if response in ['', 'n']:
+			return('skip')
+		if response == 'a':
+			return('all')
+		if response == 'q':
+			return('none')
+		if response.isdigit() and int(response) < len(pub_categories):
+			return(pub_categories[int(response)])
+		print('Answer y, n, a, q or one of the type numbers')
+
+def review_entries(bib_database, bib_index, candidates):
+	# candidates is a list of [BibTeX string, function or None]; the function is
+	# called on each parsed entry before it is shown (to set ids and the like)
+	# returns a list with, for each candidate, whether it was dealt with (added,
+	# skipped or already in the database) rather than left by q or unreadable
+	entries = []
+	owners = []
+	for (c,[bibtex_str, prepare]) in enumerate(candidates):
+		for entry in bibtexparser.loads(bibtex_str, bib_parser()).entries:
+			if prepare is not None:
+				prepare(entry)
+			entries.append(entry)
+			owners.append(c)
+
+	add_all = global_prefs.quiet
+	if entries and not add_all:
+		print(str(len(entries)) +' new entries to review. Once an entry is added any changes must be done manually.')
+		print('y adds an entry as the type shown, return or n skips it, a number adds it as that type:')
+		print(', '.join([str(n) +' ' +key for (n,key) in enumerate(pub_categories)]))
+		print('a adds all of the remaining entries and q skips them')
+
+	done = [False]*len(candidates)
+	for (n,entry) in enumerate(entries):
+		if already_added(entry, bib_index):
+			done[owners[n]] = True
+			continue
+
+		if check_keyword_exists(entry):
+			keyword = None
+		else:
+			# guess_type has no guess for a misc entry that is not a patent
+			keyword = guess_type(entry) or 'ignore'
+
+		if not add_all:
+			print('\n[' +str(n+1) +'/' +str(len(entries)) +']')
+			print(BibTexWriter()._entry_to_bibtex(entry))
+			answer = ask(entry.get('keywords') if keyword is None else keyword)
+			if answer == 'none':
+				for c in owners[n:]:
+					done[c] = False
+				break
+			if answer == 'skip':
+				done[owners[n]] = True
+				continue
+			if answer == 'all':
+				add_all = True
+			else:
+				keyword = answer
+
+		done[owners[n]] = True
+		if keyword is not None:
+			entry['keywords'] = keyword
+		bib_database.entries.append(entry)
+		bib_index.add(entry)
+
+	return(done)
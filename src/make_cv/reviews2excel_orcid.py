@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-import requests
 import argparse
 
 from collections import defaultdict
@@ -9,6 +8,7 @@ from datetime import datetime
 import pandas as pd
 import os
 
+from . import http_client
 
 ORCID_API = "https://pub.orcid.org/v3.0"
 HEADERS = {"Accept": "application/json"}
@@ -20,7 +20,7 @@ HEADERS = {"Accept": "application/json"}
 
 def get_peer_reviews(orcid):
 	url = f"{ORCID_API}/{orcid}/peer-reviews"
-	r = requests.get(url, headers=HEADERS)
+	r = http_client.get(url, source="orcid", headers=HEADERS)
 	r.raise_for_status()
 	return r.json().get("group", [])
 
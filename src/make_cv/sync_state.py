@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# What was already looked at in each source during earlier syncs
+# bib_get_entries_orcid, _scopus, _pubmed and _google remember the records
+# they have dealt with (added, already in the .bib file or rejected) in
+# ~/.cache/make_cv/sync_<source>_<id>.json so later runs only look up,
+# complete and ask about records that are new or, for ORCID, changed since
+# (the last-modified-date of the work is kept as its version).
+# Delete the file to be asked about everything again.
+# The records are only saved by save_sync_states once the .bib file with the
+# accepted entries has been written, so a failed run offers them again.
+
+import json
+import os
+import re
+
+from . import global_prefs
+
+# the states of this run that save_sync_states still has to save
+pending = []
+
+class SyncState:
+	def __init__(self, source, source_id):
+		name = 'sync_' +source +'_' +re.sub(r'[^A-Za-z0-9_.-]', '_', str(source_id)) +'.json'
+		self.filename = os.path.join(os.path.expanduser(global_prefs.cache_dir), name)
+		self.records = {}
+		try:
+			with open(self.filename, 'r', encoding='utf-8') as f:
+				self.records = json.load(f)
+		except (OSError, ValueError):
+			pass
+		self.changed = False
+		pending.append(self)
+
+	def done(self, key, version=True):
+		# True if the record was dealt with in an earlier sync and has not changed
+		return(key is not None and str(key) in self.records and self.records[str(key)] == version)
+
+	def mark(self, key, version=True):
+		if key is None or self.done(key, version):
+			return
+		self.records[str(key)] = version
+		self.changed = True
+
+	def save(self):
+		if not self.changed:
+			return
+		try:
+			os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+			with open(self.filename +'.tmp', 'w', encoding='utf-8') as f:
+				json.dump(self.records, f)
+			os.replace(self.filename +'.tmp', self.filename)
+			self.changed = False
+		except OSError as exc:
+			print('Could not save the sync state: ' +str(exc))
+
+def save_sync_states():
+	# call after the .bib file has been written
+	for state in pending:
+		state.save()
+	pending.clear()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Creates a make_cv data folder filled with made up data
+# The folder has the same layout as make_cv_files (Scholarship, Awards,
+# Service, Teaching, Proposals & Grants and make_cv/CV with a make_cv.cfg) so
+# make_cv, make_far and make_nsfcoa can be run on it.  The size is set by the
+# number of .bib entries; the spreadsheets get a tenth as many rows.  Student
+# names from the thesis, current student and undergraduate research files
+# appear as authors in the .bib file so the student markers have work to do.
+# Used by benchmark.py to time make_cv as the data grows.
+
+import argparse
+import json
+import os
+import random
+from datetime import date, datetime
+
+import pandas as pd
+import bibtexparser
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bwriter import BibTexWriter
+
+from .create_config import create_config
+from . import global_prefs
+
+first_names = ['James','Mary','Robert','Patricia','John','Jennifer','Michael','Linda','David','Elizabeth',
+				'William','Barbara','Richard','Susan','Joseph','Jessica','Thomas','Sarah','Wei','Priya',
+				'Ahmed','Yuki','Carlos','Olga','Kwame','Ingrid','Raj','Fatima','Mateo','Anika']
+last_names = ['Smith','Johnson','Williams','Brown','Jones','Garcia','Miller','Davis','Rodriguez','Martinez',
+				'Hernandez','Lopez','Wilson','Anderson','Thomas','Taylor','Moore','Jackson','Martin','Lee',
+				'Chen','Patel','Nguyen','Kim','Okafor','Schmidt','Rossi','Ivanova','Tanaka','Haddad']
+title_words = ['Flow','Turbulent','Numerical','Analysis','of','a','Wind','Turbine','Finite','Element',
+				'Method','for','Heat','Transfer','in','Porous','Media','Optimization','Adaptive','Mesh',
+				'Refinement','Droplet','Impact','on','Surfaces','Stability','Boundary','Layer','Simulation','{CFD}']
+journals = ['Journal of Fluid Mechanics','Physics of Fluids','Computers \\& Fluids','Wind Energy',
+			'International Journal of Heat and Mass Transfer','Journal of Computational Physics']
+sponsors = ['NSF','DOE','NASA','ONR','AFOSR','NIH','Industry']
+courses = [('ME515','Intro. to Finite Element Methods'),('ME326','Fluid Mechanics'),('ME201','Statics'),
+			('ME437','Heat Transfer'),('ME610','Advanced Fluid Mechanics'),('ES100','Intro. to Engineering')]
+terms = ['Spring','Summer','Fall']
+
+faculty = 'Alex B. Faculty'
+
+def person(rng):
+	return(rng.choice(first_names) +' ' +rng.choice(last_names))
+
+def title(rng,nwords=8):
+	return(' '.join(rng.choice(title_words) for n in range(nwords)).capitalize())
+
+def make_students(rng,nstudents,first_year,last_year):
+	# [name, first year, last year] for made up students
+	students = []
+	for n in range(nstudents):
+		start = rng.randint(first_year,last_year)
+		students.append([person(rng) +' ' +str(n), start, min(start +rng.randint(1,5),last_year +5)])
+	return(students)
+
+def make_bib_database(rng,nentries,grads,ugrads,first_year,last_year):
+	entry_types = {'journal': 'article', 'refereed': 'inproceedings', 'conference': 'inproceedings',
+					'book': 'book', 'patent': 'misc', 'invited': 'misc', 'arXiv': 'misc',
+					'techreport': 'techreport'}
+	categories = list(entry_types.keys())
+	weights = [30,15,30,2,3,10,5,5]
+
+	bib_database = BibDatabase()
+	for n in range(nentries):
+		category = rng.choices(categories,weights)[0]
+		year = rng.randint(first_year,last_year)
+		authors = [faculty]
+		for student in rng.sample(grads,min(2,len(grads))) +rng.sample(ugrads,min(1,len(ugrads))):
+			if student[1] <= year <= student[2] +2 and rng.random() < 0.5:
+				authors.insert(0,student[0])
+		for k in range(rng.randint(0,3)):
+			authors.append(person(rng))
+
+		entry = {'ENTRYTYPE': entry_types[category],
+					'ID': 'pub' +str(n),
+					'title': title(rng,rng.randint(4,12)),
+					'author': ' and '.join(authors),
+					'year': str(year),
+					'keywords': category,
+					'google_pub_id': 'synth' +str(n),
+					'citations': str(rng.randint(0,200))}
+		if entry['ENTRYTYPE'] == 'article':
+			entry['journal'] = rng.choice(journals)
+			entry['volume'] = str(rng.randint(1,500))
+			entry['pages'] = str(rng.randint(1,900)) +'--' +str(rng.randint(901,999))
+			entry['doi'] = '10.0000/synthetic.' +str(n)
+		elif entry['ENTRYTYPE'] == 'inproceedings':
+			entry['booktitle'] = 'Proceedings of the ' +title(rng,3) +' Conference'
+		elif category == 'patent':
+			entry['note'] = 'US Patent ' +str(rng.randint(7000000,12000000))
+		bib_database.entries.append(entry)
+
+	google_stats = {'i10index': nentries//3, 'hindex': nentries//10, 'citedby': 50*nentries,
+					'hindex5y': nentries//20, 'i10index5y': nentries//6, 'citedby5y': 20*nentries}
+	scopus_stats = {'hindex': nentries//12, 'citedby': 30*nentries, 'citations': 40*nentries}
+	bib_database.comments.append('Google_stats: ' +json.dumps(google_stats))
+	bib_database.comments.append('Scopus_stats: ' +json.dumps(scopus_stats))
+	return(bib_database)
+
+def write_sheet(filename,rows,columns):
+	os.makedirs(os.path.dirname(filename),exist_ok=True)
+	pd.DataFrame(rows,columns=columns).to_excel(filename,sheet_name='Data',index=False)
+
+def make_synthetic_data(data_dir,nentries,nrows=None,seed=0):
+	rng = random.Random(seed)
+	if nrows is None:
+		nrows = max(20,nentries//10)
+	last_year = date.today().year
+	first_year = last_year -30
+	files = global_prefs.files
+
+	def path(name):
+		return(os.path.join(data_dir,files[name]))
+
+	# Students
+	grads = make_students(rng,max(5,nrows//4),first_year,last_year)
+	ugrads = make_students(rng,max(5,nrows//2),first_year,last_year)
+	current = [student for student in grads if student[2] > last_year]
+	finished = [student for student in grads if student[2] <= last_year]
+
+	write_sheet(path('CurrentGradAdviseesFile'),
+		[[student[0],rng.choice(['ME-PhD','ME-MS']),datetime(student[1],8,15),title(rng)] for student in current],
+		['Student Name','Current Program','Start Date','Title'])
+	write_sheet(path('GradThesesFile'),
+		[[student[0],student[1],student[2],rng.choice(['Ph.D.','M.S.']),faculty,title(rng),''] for student in finished],
+		['Student','Start Date','Year','Degree','Advisor','Title','Comments'])
+	write_sheet(path('UndergradResearchFile'),
+		[[student[0],title(rng),rng.choice(['Honors','REU','Independent Study']),student[1],rng.choice(terms)] for student in ugrads],
+		['Students','Title','Program Type','Calendar Year','Term'])
+
+	# Scholarship
+	bib_database = make_bib_database(rng,nentries,grads,ugrads,first_year,last_year)
+	bibfile = path('ScholarshipFile')
+	os.makedirs(os.path.dirname(bibfile),exist_ok=True)
+	writer = BibTexWriter()
+	writer.order_entries_by = None
+	with open(bibfile,'w',encoding='utf-8') as f:
+		f.write(bibtexparser.dumps(bib_database,writer))
+
+	# Awards
+	write_sheet(path('PersonalAwardsFile'),
+		[[rng.choice(['Department','School','University','Professional','Community']),title(rng,3) +' Award',rng.randint(first_year,last_year)] for n in range(nrows)],
+		['Type','Title','Year'])
+	write_sheet(path('StudentAwardsFile'),
+		[[rng.randint(first_year,last_year),title(rng,3) +' Award',rng.choice(grads +ugrads)[0]] for n in range(nrows)],
+		['Year','Title','Student'])
+
+	# Service
+	service_columns = ['Description','Type','Position','Term','Calendar Year','Hours/Semester']
+	for name in ['ServiceFile','ProfDevelopmentFile']:
+		descriptions = [title(rng,4) +' Committee' for n in range(max(5,nrows//10))]
+		write_sheet(path(name),
+			[[rng.choice(descriptions),rng.choice(['University','Department','Professional','Community']),rng.choice(['Member','Chair']),rng.choice(terms),rng.randint(first_year,last_year),rng.randint(1,40)] for n in range(nrows)],
+			service_columns)
+
+	# Reviews (make_cv converts the .json export from Web of Science to this file)
+	reviews = os.path.splitext(path('ReviewsFile'))[0] +'.xlsx'
+	write_sheet(reviews,
+		[[rng.choice(journals),datetime(rng.randint(first_year,last_year),rng.randint(1,12),1),rng.randint(1,3)] for n in range(nrows)],
+		['Journal','Start','Rounds'])
+
+	# Teaching
+	teaching = []
+	for n in range(nrows):
+		[number,course_title] = rng.choice(courses)
+		enrollment = rng.randint(5,120)
+		responses = rng.randint(0,enrollment)
+		teaching.append([rng.choice(terms) +' ' +str(rng.randint(first_year,last_year)),number,number +'-0' +str(rng.randint(1,3)),course_title,'LEC',enrollment,
+						responses,round(rng.uniform(3,5),2),responses,round(rng.uniform(3,5),2)])
+	write_sheet(path('TeachingFile'),teaching,
+		['term','combined_course_num','combined_num_sec','course_title','component','enrollment','count_19','mean_19','count_20','mean_20'])
+
+	# Proposals & Grants (the grants table falls back to the funded proposals)
+	proposals = []
+	for n in range(nrows):
+		begin = datetime(rng.randint(first_year,last_year),rng.choice([1,6,9]),1)
+		end = datetime(begin.year +rng.randint(1,4),begin.month,1)
+		total = rng.randint(20,2000)*1000
+		proposals.append([n,faculty,rng.choice(sponsors),total*rng.choice([1,0.5,0.25]),total,rng.choice(['Y','N','N']),title(rng),
+						begin,end,datetime(begin.year -1,rng.randint(1,12),1),faculty +'(PI), ' +person(rng)])
+	write_sheet(path('ProposalsFile'),proposals,
+		['Proposal_ID','Faculty','Sponsor','Allocated Amt','Total Cost','Funded?','Title','Begin Date','End Date','Submit Date','Principal Investigators'])
+
+	# CV folder with a default configuration (data_dir is ../.. from there)
+	cv_dir = os.path.join(data_dir,'make_cv','CV')
+	os.makedirs(cv_dir,exist_ok=True)
+	os.makedirs(os.path.join(data_dir,'make_cv','Backups'),exist_ok=True)
+	os.makedirs(os.path.join(data_dir,'make_cv','PersonalData'),exist_ok=True)
+	create_config(os.path.join(cv_dir,'make_cv.cfg'))
+	return(cv_dir)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='This script creates a make_cv data folder filled with made up data')
+	parser.add_argument('-n', '--nentries',default=1000,type=int,help='the number of .bib entries, default is 1000')
+	parser.add_argument('-r', '--nrows',type=int,help='the number of rows in each spreadsheet, default is a tenth of the number of entries')
+	parser.add_argument('-s', '--seed',default=0,type=int,help='the random seed')
+	parser.add_argument('data_dir',help='the folder to create')
+	args = parser.parse_args()
+
+	cv_dir = make_synthetic_data(args.data_dir,args.nentries,args.nrows,args.seed)
+	print('Created ' +args.data_dir +'.  Run make_cv from ' +cv_dir)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Skips the tables whose inputs have not changed since they were last made
+# For every section make_cv_tables and make_far_tables record the hashes of
+# the files it reads, the settings it uses, the make_cv version and the year
+# (the tables count years back from the current one) in Tables_<name>/manifest.json,
+# together with the hashes of the tables it wrote.  A section is made again
+# only when one of these differs or one of its tables was changed or deleted.
+# With --explain the reason each section is made again is printed.
+# Tables are made in memory and a file is only replaced (atomically) when its
+# text differs, so the tables keep their dates and a failed run never leaves a
+# half written table.  changed_tables lists the tables written or removed.
+
+import hashlib
+import json
+import os
+from datetime import date
+from importlib import metadata
+
+from . import global_prefs
+
+manifest_file = 'manifest.json'
+
+def file_hash(path):
+	try:
+		with open(path,'rb') as f:
+			return(hashlib.sha256(f.read()).hexdigest())
+	except OSError:
+		return(None)
+
+def make_cv_version():
+	try:
+		return(metadata.version('make_cv'))
+	except metadata.PackageNotFoundError:
+		return('')
+
+class TableManifest:
+	def __init__(self, table_dir, explain=False):
+		self.table_dir = table_dir
+		self.explain = explain
+		self.filename = os.path.join(table_dir, manifest_file)
+		self.sections = {}
+		try:
+			with open(self.filename, 'r', encoding='utf-8') as f:
+				self.sections = json.load(f)
+		except (OSError, ValueError):
+			pass
+		self.version = make_cv_version()
+		self.year = date.today().year
+		# the .bib file is read by many sections, so each file is hashed once
+		self.hashes = {}
+		self.tables = {}
+		self.rebuilt = []
+		self.changed_tables = []
+
+	def input_hash(self, path):
+		if not path in self.hashes:
+			self.hashes[path] = file_hash(path)
+		return(self.hashes[path])
+
+	def reason(self, old, fingerprint, tables):
+		# why the section has to be made again, None if it does not
+		if old is None:
+			return('not made before')
+		if old['version'] != fingerprint['version']:
+			return('make_cv version changed')
+		if old.get('year') != fingerprint['year']:
+			return('year changed')
+		if old['settings'] != fingerprint['settings']:
+			return('settings changed')
+		for path,new_hash in fingerprint['inputs'].items():
+			if old['inputs'].get(path) != new_hash:
+				return(path +' changed')
+		for table in tables:
+			if old['tables'].get(table) != file_hash(os.path.join(self.table_dir, table)):
+				return(table +' changed or deleted')
+		return(None)
+
+	def changed(self, section, inputs, settings, tables):
+		# True if the section has to be made again.  inputs are the files the
+		# section reads, settings the configuration it uses and tables the
+		# names of the .tex files it writes
+		# every table is written differently for pandoc
+		fingerprint = {'inputs': {path: self.input_hash(path) for path in inputs},
+					'settings': json.loads(json.dumps([settings, global_prefs.usePandoc])),
+					'version': self.version,
+					'year': self.year}
+		old = self.sections.get(section)
+		reason = self.reason(old, fingerprint, tables)
+		fingerprint['tables'] = old['tables'] if reason is None else {}
+		self.sections[section] = fingerprint
+		self.tables[section] = tables
+		if reason is None:
+			return(False)
+		if self.explain:
+			print(section +': ' +reason)
+		self.rebuilt.append(section)
+		return(True)
+
+	def table_changed(self, table):
+		# make_far_tables writes some of the tables make_cv_tables made before
+		if not table in self.changed_tables:
+			self.changed_tables.append(table)
+
+	def write_table(self, table, text):
+		# writes text to the table if it differs; None removes the table (no rows)
+		path = os.path.join(self.table_dir, table)
+		if text is None:
+			if os.path.exists(path):
+				os.remove(path)
+				self.table_changed(table)
+			return
+		if file_hash(path) == hashlib.sha256(text.encode('utf-8')).hexdigest():
+			return
+		with open(path +'.tmp', 'w', encoding='utf-8', newline='') as f:
+			f.write(text)
+		os.replace(path +'.tmp', path)
+		self.table_changed(table)
+
+	def report(self):
+		if self.changed_tables:
+			print('Tables changed: ' +', '.join(self.changed_tables))
+		else:
+			print('No tables changed')
+
+	def save(self):
+		for section,tables in self.tables.items():
+			self.sections[section]['tables'] = {table: file_hash(os.path.join(self.table_dir, table)) for table in tables}
+		try:
+			with open(self.filename +'.tmp', 'w', encoding='utf-8') as f:
+				json.dump(self.sections, f, indent=1)
+			os.replace(self.filename +'.tmp', self.filename)
+		except OSError as exc:
+			print('Could not save the table manifest: ' +str(exc))
@@ -18,6 +18,7 @@ import numpy as np
 import pandas as pd
 
 from .bib2latex_far import getyear
+from .bib_reader import iter_bib_entries
 from .stringprotect import split_names
 from .stringprotect import abbreviate_name
 from .stringprotect import str2latex
@@ -25,8 +26,6 @@ from . import global_prefs
 
 def read_thesis_bib(thesisfile):
 	import pandas as pd
-	import bibtexparser
-	from bibtexparser.bparser import BibTexParser
 
 	# Create dataframe
 	df = pd.DataFrame(columns=[
@@ -43,8 +42,7 @@ def read_thesis_bib(thesisfile):
 	for enc in ("utf-8", "cp1252", "latin-1"):
 		try:
 			with open(thesisfile, encoding=enc) as bibtex_file:
-				tbparser = BibTexParser()
-				bib_database = bibtexparser.load(bibtex_file, tbparser)
+				bibtex_str = bibtex_file.read()
 			break
 		except UnicodeDecodeError:
 			continue
@@ -55,13 +53,13 @@ def read_thesis_bib(thesisfile):
 		print(f"Could not decode file: {thesisfile}")
 		return df
 
-	bib_database.entries = sorted(
-		bib_database.entries,
+	entries = sorted(
+		iter_bib_entries(bibtex_str),
 		key=lambda k: getyear(k),
 		reverse=True
 	)
 
-	for paperbibentry in bib_database.entries:
+	for paperbibentry in entries:
 		row = {}
 
 		if "author" in paperbibentry:
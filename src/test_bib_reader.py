@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import sys
+from make_cv.bib_reader import iter_bib_entries
+
+# values bibtexparser does not read the way BibTeX does: it drops an entry
+# whose value starts with a number followed by #
+concatenations = [
+    ['@article{a, year = 2001 # "", title = {x}}', {'year': '2001', 'title': 'x'}],
+    ['@string{mid = "-"}\n@article{a, year = 2001 # mid # 2002, pages = {1} # 2}', {'year': '2001-2002', 'pages': '12'}],
+    ['@article{a, year = 2001, title = "x" # {y}}', {'year': '2001', 'title': 'xy'}],
+]
+
+def test_concatenations():
+    for [bibtex_str, fields] in concatenations:
+        assert list(iter_bib_entries(bibtex_str)) == [dict(fields, ENTRYTYPE='article', ID='a')]
+
+def test_malformed_entry():
+    # like bibtexparser the entry with unbalanced braces is skipped
+    bibtex_str = '@phdthesis{a,title={X {bad},year={2001}}\n@phdthesis{b,title={Y},year={2002}}\n@phdthesis{c,title={Z},year={2002}}\n'
+    assert [entry['ID'] for entry in iter_bib_entries(bibtex_str)] == ['b', 'c']
+
+if __name__ == '__main__':
+    test_concatenations()
+    test_malformed_entry()
+    sys.exit(0)